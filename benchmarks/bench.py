@@ -0,0 +1,394 @@
+"""Benchmarks - Training, prediction and analysis hot paths
+
+Generates synthetic datasets shaped like dataset_train.csv, then times
+every case in a fresh worker process so its peak RSS is its own. Each
+case is timed over several runs, then run once more under tracemalloc to
+record the peak of traced allocations. Results are written as json and
+can be compared against a previous run.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib
+
+matplotlib.use('Agg')
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root)
+for folder in ('logistic_regression', 'data_analysis', 'data_visualization'):
+    sys.path.append(os.path.join(root, folder))
+
+from logreg_train import train_model, prediction
+from describe import describeData
+from histogram import houseHistograms
+from dslr_extra.utils import getLRData, getNumericData, normalizeData
+from dslr_extra.loader import loadDataset, groupViews
+from dslr_extra.stats import default_percentiles
+
+houses = ['Ravenclaw', 'Hufflepuff', 'Gryffindor', 'Slytherin']
+courses = [
+    'Arithmancy', 'Astronomy', 'Herbology', 'Defense Against the Dark Arts',
+    'Divination', 'Muggle Studies', 'Ancient Runes', 'History of Magic',
+    'Transfiguration', 'Potions', 'Care of Magical Creatures', 'Charms',
+    'Flying'
+]
+rows = [1000, 10000, 100000]
+features = [13]
+repeat = 3
+train_iterations = 100
+missing = 0.02
+write_rows = 100000
+threshold = 0.1
+
+c_green = "\033[92m"
+c_red = "\033[91m"
+c_grey = "\033[90m"
+c_end = "\033[0m"
+
+
+def feature_names(count: int) -> list[str]:
+    """Return the column names of count features, the real courses first
+
+        Parameters:
+            count (int): number of features
+
+        Returns:
+            list[str]: feature names
+    """
+    return courses[:count] + [
+        f'Course {i}' for i in range(len(courses), count)
+    ]
+
+
+def generate_dataset(path: str, rows_num: int, features_num: int,
+                     seed: int = 0) -> None:
+    """Write a synthetic training set: every feature is normal around a
+    per-house mean, with a few missing grades
+
+        Parameters:
+            path (str): csv file to write
+            rows_num (int): number of students
+            features_num (int): number of features
+            seed (int): random seed
+    """
+    rng = np.random.default_rng(seed)
+    names = feature_names(features_num)
+    centers = rng.normal(0, 1, (len(houses), features_num))
+    scales = rng.uniform(1, 1000, features_num)
+
+    tmp = f'{path}.tmp'
+    for start in range(0, rows_num, write_rows):
+        size = min(write_rows, rows_num - start)
+        labels = rng.integers(0, len(houses), size)
+        values = (centers[labels] + rng.normal(0, 1, (size, features_num)))
+        values *= scales
+        values[rng.random(values.shape) < missing] = np.nan
+
+        chunk = pd.DataFrame(values, columns=names)
+        chunk.insert(0, 'Hogwarts House', np.array(houses)[labels])
+        chunk.insert(1, 'First Name', 'Harry')
+        chunk.insert(2, 'Last Name', 'Potter')
+        chunk.insert(3, 'Birthday', '2000-07-31')
+        chunk.insert(4, 'Best Hand', np.where(labels % 2, 'Left', 'Right'))
+        chunk.index = pd.RangeIndex(start, start + size, name='Index')
+        chunk.to_csv(tmp, mode='w' if start == 0 else 'a', header=start == 0)
+
+    os.replace(tmp, path)
+
+
+def setup_get_lr_data(dataset: str):
+    """Parse and normalize the training set
+    """
+    return lambda: getLRData(dataset, houses)
+
+
+def setup_normalize(dataset: str):
+    """Min-max normalize the numeric columns
+    """
+    data = getNumericData(dataset)
+    return lambda: normalizeData(data)
+
+
+def setup_train(dataset: str):
+    """Run train_iterations gradient descent iterations
+    """
+    x, y, _ = getLRData(dataset, houses)
+    return lambda: train_model(
+        x, y, houses, train_iterations, tol=0, quiet=True)
+
+
+def setup_prediction(dataset: str):
+    """Score every student with random weights
+    """
+    x, _, _ = getLRData(dataset, houses)
+    rng = np.random.default_rng(0)
+    w = rng.normal(0, 1, (x.shape[0], len(houses)))
+    b = rng.normal(0, 1, (len(houses), 1))
+    return lambda: prediction(x, w, b)
+
+
+def setup_describe(dataset: str):
+    """Compute the describe statistics of every column
+    """
+    data = getNumericData(dataset)
+    return lambda: describeData(data, default_percentiles)
+
+
+def setup_plot_prep(dataset: str):
+    """Split the houses and bin the histogram of every course
+    """
+    data = loadDataset(dataset)
+    numeric = data.select_dtypes(include=['number']).columns
+
+    def run():
+        groups = groupViews(data)
+        for course in numeric:
+            houseHistograms([group[course] for group in groups.values()])
+
+    return run
+
+
+cases = {
+    'getLRData': setup_get_lr_data,
+    'normalizeData': setup_normalize,
+    'train_model': setup_train,
+    'prediction': setup_prediction,
+    'describe': setup_describe,
+    'plot_prep': setup_plot_prep
+}
+
+
+def rss() -> int:
+    """Return the peak resident set size of this process
+
+        Returns:
+            int: peak RSS in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(case: str, dataset: str, runs: int) -> dict:
+    """Time one case, then measure its allocations. Runs in a fresh
+    worker process
+
+        Parameters:
+            case (str): name of the case
+            dataset (str): path to the dataset
+            runs (int): number of timed runs
+
+        Returns:
+            dict: best and median time, peak traced allocations and peak
+            RSS of the worker before and after the case
+    """
+    start_rss = rss()
+    run = cases[case](dataset)
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak_alloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'best': min(times),
+        'median': float(np.median(times)),
+        'peak_alloc_bytes': peak_alloc,
+        'start_rss_bytes': start_rss,
+        'peak_rss_bytes': rss()
+    }
+
+
+def run_benchmarks(args: argparse.Namespace, data_dir: str) -> list[dict]:
+    """Generate the datasets and run every case on each of them
+
+        Parameters:
+            args (argparse.Namespace): benchmark settings
+            data_dir (str): directory of the generated datasets
+
+        Returns:
+            list[dict]: one result per case and dataset shape
+    """
+    results = []
+    for rows_num in args.rows:
+        for features_num in args.features:
+            dataset = os.path.join(data_dir,
+                                   f'train_{rows_num}x{features_num}.csv')
+            if not os.path.exists(dataset):
+                print(f'{c_grey}Generating {dataset}{c_end}')
+                generate_dataset(dataset, rows_num, features_num)
+
+            for case in args.cases:
+                with ProcessPoolExecutor(1) as executor:
+                    result = executor.submit(run_case, case, dataset,
+                                             args.repeat).result()
+
+                result = {
+                    'case': case,
+                    'rows': rows_num,
+                    'features': features_num,
+                    **result, 'rows_per_second': rows_num / result['best']
+                }
+                results.append(result)
+                print(f'- {case} {rows_num}x{features_num}: '
+                      f'{result["best"]:.4f}s '
+                      f'| {result["rows_per_second"]:.0f} rows/s '
+                      f'| alloc {result["peak_alloc_bytes"] / 2**20:.1f} MiB '
+                      f'| rss {result["peak_rss_bytes"] / 2**20:.1f} MiB')
+
+    return results
+
+
+def compare(results: list[dict], path: str, limit: float) -> int:
+    """Print the change of every case against a previous run
+
+        Parameters:
+            results (list[dict]): results of this run
+            path (str): json file of the previous run
+            limit (float): relative slowdown reported as a regression
+
+        Returns:
+            int: number of regressions
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        baseline = {(r['case'], r['rows'], r['features']): r
+                    for r in json.load(file)['results']}
+
+    print(f'\nCompared to {path}:')
+    regressions = 0
+    for result in results:
+        key = (result['case'], result['rows'], result['features'])
+        if key not in baseline:
+            continue
+
+        before = baseline[key]
+        ratio = result['best'] / before['best']
+        rss = result['peak_rss_bytes'] / before['peak_rss_bytes']
+        color = c_grey
+        if ratio > 1 + limit:
+            color = c_red
+            regressions += 1
+        elif ratio < 1 - limit:
+            color = c_green
+
+        print(f'- {color}{key[0]} {key[1]}x{key[2]}: time x{ratio:.2f} '
+              f'| rss x{rss:.2f}{c_end}')
+
+    return regressions
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: benchmark settings
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the training, prediction and analysis paths')
+    parser.add_argument('-r',
+                        '--rows',
+                        type=int,
+                        nargs='+',
+                        default=rows,
+                        help='dataset sizes in rows')
+    parser.add_argument('-f',
+                        '--features',
+                        type=int,
+                        nargs='+',
+                        default=features,
+                        help='dataset widths in features')
+    parser.add_argument('--cases',
+                        nargs='+',
+                        choices=list(cases),
+                        default=list(cases),
+                        help='cases to run')
+    parser.add_argument('-n',
+                        '--repeat',
+                        type=int,
+                        default=repeat,
+                        help='timed runs per case')
+    parser.add_argument('-d',
+                        '--data-dir',
+                        help='keep the generated datasets in this directory '
+                        '(temporary by default)')
+    parser.add_argument('-o',
+                        '--output',
+                        help='json results file (default: '
+                        'benchmarks/results/<timestamp>.json)')
+    parser.add_argument('-c',
+                        '--compare',
+                        help='json results of a previous run to compare with')
+    parser.add_argument('-t',
+                        '--threshold',
+                        type=float,
+                        default=threshold,
+                        help='relative slowdown reported as a regression')
+    parser.add_argument('--cache',
+                        action='store_true',
+                        help='load datasets through the binary cache instead '
+                        'of parsing the csv on every run')
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Main function
+    """
+    args = parse_arguments()
+    if args.compare and not os.path.exists(args.compare):
+        raise Exception(f'{args.compare} not found')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, 'cache') if args.cache else ''
+        os.environ['DSLR_CACHE_DIR'] = cache
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        results = run_benchmarks(args, data_dir)
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(
+            {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'machine': platform.platform(),
+                'cpus': os.cpu_count(),
+                'cache': args.cache,
+                'results': results
+            },
+            file,
+            indent=2)
+    print(f'\nResults saved to {output}')
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        raise Exception('performance regressions found')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        sys.exit('\nExiting...')
+    except Exception as e:
+        sys.exit(f'Error. {e}')
@@ -0,0 +1,153 @@
+"""Benchmarks - Startup time budget
+
+Runs every entry point with --help, which imports everything the script
+imports at startup and exits before doing any work. Each script gets the
+best wall time over a few runs, checked against its budget, and the list
+of heavy modules it must not import at startup. Budgets are multiples of
+the time a bare interpreter takes to import the libraries the script
+cannot avoid on the same machine: numpy and pandas for the scripts that
+parse csv files, numpy alone for the converter and the server.
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+repeat = 5
+
+baselines = {'numpy': 'import numpy', 'pandas': 'import numpy, pandas'}
+
+# script: (baseline, budget relative to it, modules it must not import)
+budgets = {
+    'logistic_regression/logreg_predict.py':
+    ('pandas', 1.5, ['sklearn', 'alive_progress', 'matplotlib']),
+    'logistic_regression/logreg_serve.py':
+    ('numpy', 2.5, ['pandas', 'sklearn', 'alive_progress', 'matplotlib']),
+    'logistic_regression/convert_model.py':
+    ('numpy', 2.5, ['pandas', 'sklearn', 'alive_progress', 'matplotlib']),
+    'logistic_regression/evaluate.py':
+    ('pandas', 1.5, ['sklearn', 'matplotlib']),
+    'logistic_regression/logreg_train.py':
+    ('pandas', 1.5, ['sklearn', 'alive_progress', 'matplotlib']),
+    'logistic_regression/logreg_cv.py':
+    ('pandas', 1.5, ['sklearn', 'alive_progress', 'matplotlib']),
+    'data_analysis/describe.py': ('pandas', 1.5, ['sklearn', 'matplotlib']),
+    'data_visualization/histogram.py':
+    ('pandas', 1.5, ['sklearn', 'matplotlib']),
+    'data_visualization/scatter_plot.py':
+    ('pandas', 1.5, ['sklearn', 'matplotlib']),
+    'data_visualization/pair_plot.py':
+    ('pandas', 1.5, ['sklearn', 'matplotlib']),
+    'data_visualization/render_all.py': ('pandas', 3.5, ['sklearn'])
+}
+
+c_green = "\033[92m"
+c_red = "\033[91m"
+c_grey = "\033[90m"
+c_end = "\033[0m"
+
+
+def best_time(command: list[str], runs: int) -> float:
+    """Return the best wall time of a command
+
+        Parameters:
+            command (list[str]): command and its arguments
+            runs (int): number of runs
+
+        Returns:
+            float: best time in seconds
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def imported_modules(script: str) -> set[str]:
+    """Return the modules imported by `python script --help`
+
+        Parameters:
+            script (str): path to the script
+
+        Returns:
+            set[str]: fully qualified module names
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', script, '--help'],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True)
+    return {
+        line.rsplit('|', 1)[1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith('import time:') and '|' in line
+    }
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: startup benchmark settings
+    """
+    parser = argparse.ArgumentParser(
+        description='Check the startup time of every entry point')
+    parser.add_argument('-n',
+                        '--repeat',
+                        type=int,
+                        default=repeat,
+                        help='runs per script, the best one is kept')
+    parser.add_argument('-s',
+                        '--scale',
+                        type=float,
+                        default=1.0,
+                        help='multiply every budget')
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Main function
+    """
+    args = parse_arguments()
+    failures = 0
+
+    reference = {}
+    for name, code in baselines.items():
+        reference[name] = best_time([sys.executable, '-c', code], args.repeat)
+        print(f'{c_grey}Baseline {name} ({code}): '
+              f'{reference[name]:.3f}s{c_end}')
+
+    for script, (baseline, budget, forbidden) in budgets.items():
+        path = os.path.join(root, script)
+        elapsed = best_time([sys.executable, path, '--help'], args.repeat)
+        modules = imported_modules(path)
+        heavy = sorted(module for module in forbidden if module in modules)
+
+        limit = reference[baseline] * budget * args.scale
+        ok = elapsed <= limit and not heavy
+        failures += not ok
+        color = c_green if ok else c_red
+        print(f'- {script}: {color}{elapsed:.3f}s{c_end} '
+              f'{c_grey}| budget {limit:.2f}s (x{budget:g} {baseline})'
+              f'{c_end}' +
+              (f' {c_red}| imports {", ".join(heavy)}{c_end}' if heavy else ''))
+
+    if failures:
+        raise Exception(f'{failures} entry points over their startup budget')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        sys.exit('\nExiting...')
+    except Exception as e:
+        sys.exit(f'Error. {e}')
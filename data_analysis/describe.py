@@ -2,122 +2,217 @@
 """
 
 from os import sys, path
-from math import nan, sqrt
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from itertools import repeat
+import numpy as np
 import pandas as pd
 
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
-from dslr_extra.utils import getNumericData, parse_input
+from dslr_extra.utils import (getNumericData, getNumericChunks, check_file,
+                              split_csv)
+from dslr_extra.stats import (describe, default_percentiles, partial_describe,
+                              merge_partial, finalize_describe, sketch_size)
 
+chunksize = 100000
+error = 0.01
+seed = 0
 
-def setCount(df: pd.DataFrame, data: pd.DataFrame, col: str) -> None:
-    """Count non null values
+
+def statsToFrame(stats: dict, columns: list[str]) -> pd.DataFrame:
+    """Build the describe table
 
         Parameters:
-            df (pd.DataFrame): dataframe to update
-            data (pd.DataFrame): data to count
-            col (str): column to count
+            stats (dict): one array per statistic
+            columns (list[str]): described columns
+
+        Returns:
+            pd.DataFrame: statistics x columns
     """
-    df.at['count', col] = data[col].notnull().sum()
+    describe_df = pd.DataFrame(columns=columns,
+                               index=list(stats),
+                               dtype=object)
+    for name, values in stats.items():
+        describe_df.loc[name] = list(values)
 
+    return describe_df
 
-def setMean(df: pd.DataFrame, data: pd.DataFrame, col: str) -> None:
-    """Calculate the mean
+
+def describeData(data: pd.DataFrame,
+                 percentiles: list[float],
+                 jobs: int = 1) -> pd.DataFrame:
+    """Describe every numeric column of data. With several jobs, groups of
+    columns are described in parallel worker processes
 
         Parameters:
-            df (pd.DataFrame): dataframe to update
-            data (pd.DataFrame): data to count
-            col (str): column to count
+            data (pd.DataFrame): numeric data
+            percentiles (list[float]): percentiles to calculate
+            jobs (int): number of worker processes
+
+        Returns:
+            pd.DataFrame: statistics x columns
     """
-    size = df.at['count', col]
-    df.at['mean', col] = data[col].sum() / size if size != 0 else nan
+    values = data.to_numpy(dtype=float)
 
+    if jobs <= 1 or values.shape[1] < 2:
+        stats = describe(values, percentiles)
+        return statsToFrame(stats, data.columns.values)
 
-def setStd(df: pd.DataFrame, data: pd.DataFrame, col: str) -> None:
-    """Calculate the Std Deviation
+    groups = np.array_split(np.arange(values.shape[1]),
+                            min(jobs, values.shape[1]))
+    with ProcessPoolExecutor(len(groups)) as executor:
+        results = list(
+            executor.map(describe, [values[:, group] for group in groups],
+                         repeat(percentiles)))
 
-        Parameters:
-            df (pd.DataFrame): dataframe to update
-            data (pd.DataFrame): data to count
-            col (str): column to count
-    """
-    size = df.at['count', col]
-    mean = df.at['mean', col]
-    numerator = ((data[col] - mean)**2).sum()
-    df.at['std', col] = sqrt(numerator / size) if size != 0 else nan
+    stats = {
+        name: np.concatenate([result[name] for result in results])
+        for name in results[0]
+    }
+    return statsToFrame(stats, data.columns.values)
 
 
-def setMin(df: pd.DataFrame, data: pd.DataFrame, col: str) -> None:
-    """Calculate the Minimum value
+def describeShard(dataset: str, shard: tuple[int, int], columns: list[str],
+                  size: int, k: int, seed: int) -> tuple:
+    """Partial statistics of one byte range of the dataset
 
         Parameters:
-            df (pd.DataFrame): dataframe to update
-            data (pd.DataFrame): data to count
-            col (str): column to count
+            dataset (str): path to the dataset
+            shard (tuple[int, int]): byte range to read
+            columns (list[str]): numeric columns
+            size (int): number of rows read at once
+            k (int): sketch parameter
+            seed (int): seed of the run, every chunk seeds its sketches
+            with it and its position in the file
+
+        Returns:
+            tuple: partial_describe results of the shard, None if empty
     """
-    df.at['min', col] = data[col].sort_values().iloc[0]
-
-
-def setMax(df: pd.DataFrame, data: pd.DataFrame, col: str) -> None:
-    """Calculate the Maximum value
+    partial = None
+    for i, chunk in enumerate(getNumericChunks(dataset, size, shard, columns)):
+        block = partial_describe(chunk.to_numpy(dtype=float), k,
+                                 (seed, shard[0], i))
+        partial = block if partial is None else merge_partial(partial, block)
+
+    return partial
+
+
+def describeStream(dataset: str,
+                   percentiles: list[float],
+                   size: int,
+                   rank_error: float,
+                   jobs: int = 1,
+                   seed: int = seed) -> pd.DataFrame:
+    """Describe every numeric column reading the dataset in chunks. Moments
+    are merged exactly, percentiles are estimated with quantile sketches.
+    With several jobs, the file is split into line-aligned byte ranges
+    described in parallel worker processes and merged in file order. The
+    sketches of every chunk are seeded with seed and the chunk position in
+    the file, so a run is reproducible, and a different seed or number of
+    jobs only changes the percentiles within the rank error
 
         Parameters:
-            df (pd.DataFrame): dataframe to update
-            data (pd.DataFrame): data to count
-            col (str): column to count
+            dataset (str): path to the dataset
+            percentiles (list[float]): percentiles to calculate
+            size (int): number of rows read at once
+            rank_error (float): target normalized rank error of percentiles
+            jobs (int): number of worker processes
+            seed (int): seed of the quantile sketches
+
+        Returns:
+            pd.DataFrame: statistics x columns
     """
-    size = df.at['count', col]
-    df.at['max', col] = data[col].sort_values().iloc[size - 1]
+    k = sketch_size(rank_error)
+    first = next(getNumericChunks(dataset, size), None)
 
+    if first is None:
+        raise Exception('Dataset is empty')
 
-def setPercentile(df: pd.DataFrame, data: pd.DataFrame, col: str,
-                  percentile: int) -> None:
-    """Calculate the Percentile
+    columns = first.columns
+    shards = split_csv(dataset, max(jobs, 1))
 
-        Parameters:
-            df (pd.DataFrame): dataframe to update
-            data (pd.DataFrame): data to count
-            col (str): column to count
-            percentile (int): percentile to calculate
-    """
-    size = df.at['count', col]
-    sorted_values = data[col].sort_values()
+    if len(shards) > 1:
+        with ProcessPoolExecutor(len(shards)) as executor:
+            partials = list(
+                executor.map(describeShard, repeat(dataset), shards,
+                             repeat(columns), repeat(size), repeat(k),
+                             repeat(seed)))
+    else:
+        partials = [
+            describeShard(dataset, shards[0], columns, size, k, seed)
+        ]
 
-    rank = percentile / 100 * (size)
-    rank_decimal = rank % 1
-    rank_rounded = rank - rank_decimal
+    partial = reduce(merge_partial, [p for p in partials if p is not None])
+    return statsToFrame(finalize_describe(partial, percentiles),
+                        columns.values)
 
-    lower = sorted_values.iloc[int(rank_rounded)]
-    if int(rank_rounded + 1) >= size:
-        upper = lower
-    else:
-        upper = sorted_values.iloc[int(rank_rounded) + 1]
 
-    percentile_value = lower + rank_decimal * (upper - lower)
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
 
-    df.at[str(percentile) + '%', col] = percentile_value
+        Return:
+            argparse.Namespace: describe settings
+    """
+    parser = argparse.ArgumentParser(
+        description='Describe the numeric columns of a dataset')
+    parser.add_argument('dataset', help='path to the dataset')
+    parser.add_argument('-p',
+                        '--percentiles',
+                        type=float,
+                        nargs='+',
+                        default=default_percentiles,
+                        help='percentiles to calculate, between 0 and 100')
+    parser.add_argument('-c',
+                        '--chunksize',
+                        type=int,
+                        nargs='?',
+                        const=chunksize,
+                        help='stream the dataset in chunks of this many rows '
+                        f'(default {chunksize}) with constant memory, '
+                        'percentiles are approximated')
+    parser.add_argument('-e',
+                        '--error',
+                        type=float,
+                        default=error,
+                        help='target rank error of approximated percentiles')
+    parser.add_argument('-s',
+                        '--seed',
+                        type=int,
+                        default=seed,
+                        help='seed of the approximated percentiles')
+    parser.add_argument('--exact',
+                        action='store_true',
+                        help='ignore --chunksize and compute exact statistics '
+                        'in memory')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='number of worker processes')
+
+    args = parser.parse_args()
+    check_file(args.dataset)
+
+    if any(p < 0 or p > 100 for p in args.percentiles):
+        sys.exit('Error. Percentiles must be between 0 and 100')
+
+    return args
 
 
 def main() -> None:
     """Main function
     """
-    dataset = parse_input(1, ["dataset.csv"])
-    data = getNumericData(dataset)
-
-    describe = pd.DataFrame(
-        columns=data.columns.values,
-        index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
-
-    for col in data:
-        setCount(describe, data, col)
-        setMean(describe, data, col)
-        setStd(describe, data, col)
-        setMin(describe, data, col)
-        setMax(describe, data, col)
-        setPercentile(describe, data, col, 25)
-        setPercentile(describe, data, col, 50)
-        setPercentile(describe, data, col, 75)
-
-    print(describe)
+    args = parse_arguments()
+
+    if args.chunksize and not args.exact:
+        print(
+            describeStream(args.dataset, args.percentiles, args.chunksize,
+                           args.error, args.jobs, args.seed))
+        return
+
+    data = getNumericData(args.dataset)
+    print(describeData(data, args.percentiles, args.jobs))
 
 
 if __name__ == "__main__":
@@ -1,47 +1,124 @@
 """Data visualization - Histogram
 """
 from os import sys, path
-import matplotlib.pyplot as plt
+import argparse
+import numpy as np
 
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
-from dslr_extra.utils import getVisualData, parse_input
+from dslr_extra.utils import getVisualData, check_file, houseColors
 
+bins = 10
 
-def printHistogram(houses_data: list, course: list) -> None:
-    """Show a histogram of the selected course
+
+def houseHistograms(houses_values: list,
+                    bins_num: int = bins) -> tuple[np.ndarray, np.ndarray]:
+    """Bin the grades of every house on shared edges
+
+        Parameters:
+            houses_values (list): grades of each house, NaN for missing
+            bins_num (int): number of bins
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: houses x bins counts and bin edges
+    """
+    houses_values = [np.asarray(values, dtype=float) for values in houses_values]
+    houses_values = [values[~np.isnan(values)] for values in houses_values]
+    edges = np.histogram_bin_edges(np.concatenate(houses_values), bins_num)
+    counts = np.array(
+        [np.histogram(values, bins=edges)[0] for values in houses_values])
+
+    return counts, edges
+
+
+def plotHistogram(houses_data: list,
+                  course: list,
+                  houses: list[str],
+                  bins_num: int = bins):
+    """Build a histogram of the selected course. Counts are binned with
+    NumPy first, so drawing cost does not depend on the number of students
 
         Parameters:
             houses_data (list): list of houses data
             course (list): list of courses
+            houses (list[str]): house of each houses data entry
+            bins_num (int): number of bins
+
+        Returns:
+            matplotlib.figure.Figure: histogram figure
     """
+    import matplotlib.pyplot as plt
+
     course_1 = course[0]
     houses_data_1 = houses_data[0]
-    colors = ['red', 'green', 'yellow', 'blue']
-    labels = ['Gryffindor', 'Slytherin', 'Hufflepuff', 'Ravenclaw']
+    colors = houseColors(houses)
 
-    plt.figure(num='Histogram')
+    fig = plt.figure(num='Histogram')
     plt.title(course_1)
 
-    plt.hist(houses_data_1,
-             label=labels,
-             color=colors,
-             alpha=0.6,
-             histtype='bar',
-             rwidth=0.8)
+    counts, edges = houseHistograms(houses_data_1, bins_num)
+    widths = np.diff(edges)
+    bar = widths * 0.8 / len(counts)
+
+    for i, house_counts in enumerate(counts):
+        plt.bar(edges[:-1] + widths * 0.1 + i * bar,
+                house_counts,
+                width=bar,
+                align='edge',
+                label=houses[i],
+                color=colors[i],
+                alpha=0.6)
 
     plt.grid(alpha=0.2)
     plt.xlabel('Grade')
     plt.ylabel('# of Students')
     plt.legend()
+    return fig
+
+
+def printHistogram(houses_data: list,
+                   course: list,
+                   houses: list[str],
+                   bins_num: int = bins) -> None:
+    """Show a histogram of the selected course
+
+        Parameters:
+            houses_data (list): list of houses data
+            course (list): list of courses
+            houses (list[str]): house of each houses data entry
+            bins_num (int): number of bins
+    """
+    import matplotlib.pyplot as plt
+
+    plotHistogram(houses_data, course, houses, bins_num)
     plt.show()
 
 
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: histogram settings
+    """
+    parser = argparse.ArgumentParser(description='Histogram of a course')
+    parser.add_argument('dataset', help='path to the dataset')
+    parser.add_argument('-b',
+                        '--bins',
+                        type=int,
+                        default=bins,
+                        help='number of bins')
+
+    args = parser.parse_args()
+    check_file(args.dataset)
+
+    return args
+
+
 def main():
     """Main function
     """
-    dataset = parse_input(1, ["dataset.csv"])
-    houses_data, course = getVisualData(dataset, 1)
-    printHistogram(houses_data, course)
+    args = parse_arguments()
+    houses_data, course, houses = getVisualData(args.dataset, 1)
+    printHistogram(houses_data, course, houses, args.bins)
 
 
 if __name__ == "__main__":
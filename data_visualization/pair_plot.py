@@ -1,139 +1,284 @@
 """Data visualization - Pair Plot
+
+Every cell of the grid is drawn on a single axes, with each course
+rescaled to the [0, 1] range of its cell. Scatter cells are one collection
+per house for the whole grid and density cells are a single image, so the
+number of matplotlib artists does not grow with the number of courses.
 """
 from os import sys, path
+import argparse
 from textwrap import wrap
-import matplotlib.pyplot as plt
+import numpy as np
 
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
-from dslr_extra.utils import getVisualData, parse_input
+from dslr_extra.utils import (getVisualData, check_file, blendDensity,
+                              houseColors)
+modes = ['auto', 'scatter', 'density']
+point_budget = 2000000
+histogram_bins = 10
+density_bins = 32
+padding = 0.05
 
 
-def subplotHistogram(plot, houses_data):
-    """Subplot a histogram of the given data
+def normalizeColumns(values: np.ndarray, low: np.ndarray,
+                     high: np.ndarray) -> np.ndarray:
+    """Rescale every column to [0, 1]
 
         Parameters:
-            plot (matplotlib.pyplot): plot to draw on
-            houses_data (list): list of houses data
+            values (np.ndarray): students x courses
+            low (np.ndarray): minimum of each course
+            high (np.ndarray): maximum of each course
+
+        Returns:
+            np.ndarray: rescaled values, NaN kept
     """
-    colors = ['red', 'green', 'yellow', 'blue']
-    labels = ['Gryffindor', 'Slytherin', 'Hufflepuff', 'Ravenclaw']
+    scale = np.where(high > low, high - low, 1)
+    return (values - low) / scale
+
+
+def cellPairs(plots_num: int, lower: bool) -> np.ndarray:
+    """Return the (row, column) course pairs of the off-diagonal cells
 
-    plot.hist(houses_data,
-              label=labels,
-              color=colors,
-              alpha=0.6,
-              histtype='bar',
-              rwidth=0.8)
+        Parameters:
+            plots_num (int): number of courses
+            lower (bool): only the lower triangle
+
+        Returns:
+            np.ndarray: pairs x 2
+    """
+    rows, cols = np.indices((plots_num, plots_num))
+    mask = rows > cols if lower else rows != cols
+    return np.column_stack((rows[mask], cols[mask]))
 
 
-def subplotScatter(plot, houses_data_1, houses_data_2):
-    """Subplot a scatter plot of the given data
+def drawHistograms(ax, houses_norm: list[np.ndarray], plots_num: int,
+                   colors: list[str]) -> None:
+    """Draw the histogram of every course on the diagonal cells, side by
+    side bars with one collection per house
 
         Parameters:
-            plot (matplotlib.pyplot): plot to draw on
-            houses_data_1 (list): list of houses data
-            houses_data_2 (list): list of houses data
+            ax (matplotlib.axes.Axes): axes to draw on
+            houses_norm (list[np.ndarray]): rescaled values per house
+            plots_num (int): number of courses
+            colors (list[str]): color of each house
     """
-    colors = ['red', 'green', 'yellow', 'blue']
-    labels = ['Gryffindor', 'Slytherin', 'Hufflepuff', 'Ravenclaw']
-
-    griffindor = houses_data_1[0], houses_data_2[0]
-    slytherin = houses_data_1[1], houses_data_2[1]
-    hufflepuff = houses_data_1[2], houses_data_2[2]
-    ravenclaw = houses_data_1[3], houses_data_2[3]
-
-    plot.scatter(griffindor[0],
-                 griffindor[1],
-                 label=labels[0],
-                 color=colors[0],
-                 alpha=0.6,
-                 s=0.5)
-
-    plot.scatter(slytherin[0],
-                 slytherin[1],
-                 label=labels[1],
-                 color=colors[1],
-                 alpha=0.6,
-                 s=0.5)
-
-    plot.scatter(hufflepuff[0],
-                 hufflepuff[1],
-                 label=labels[2],
-                 color=colors[2],
-                 alpha=0.6,
-                 s=0.5)
-
-    plot.scatter(ravenclaw[0],
-                 ravenclaw[1],
-                 label=labels[3],
-                 color=colors[3],
-                 alpha=0.6,
-                 s=0.5)
-
-
-def printPairPlot(houses_raw_data, courses):
-    """Generate all the subplots for the pair plot
+    from matplotlib.collections import PolyCollection
+
+    edges = np.linspace(0, 1, histogram_bins + 1)
+    counts = np.array([[
+        np.histogram(house[:, course][~np.isnan(house[:, course])],
+                     bins=edges)[0] for course in range(plots_num)
+    ] for house in houses_norm])
+    peak = np.maximum(counts.max(axis=(0, 2)), 1)
+
+    span = 1 - 2 * padding
+    width = span / histogram_bins
+    bar = width * 0.8 / len(houses_norm)
+
+    for i, house_counts in enumerate(counts):
+        polygons = []
+        for course in range(plots_num):
+            bottom = plots_num - 1 - course + padding
+            heights = house_counts[course] / peak[course] * span
+            for b, height in enumerate(heights):
+                left = course + padding + b * width + width * 0.1 + i * bar
+                polygons.append([(left, bottom), (left, bottom + height),
+                                 (left + bar, bottom + height),
+                                 (left + bar, bottom)])
+
+        ax.add_collection(
+            PolyCollection(polygons,
+                           facecolors=colors[i],
+                           alpha=0.6,
+                           linewidths=0))
+
+
+def drawScatter(ax, houses_norm: list[np.ndarray], pairs: np.ndarray,
+                plots_num: int, colors: list[str]) -> None:
+    """Draw every off-diagonal cell as scatter points, one collection per
+    house for the whole grid
+
+        Parameters:
+            ax (matplotlib.axes.Axes): axes to draw on
+            houses_norm (list[np.ndarray]): rescaled values per house
+            pairs (np.ndarray): (row, column) course pairs to draw
+            plots_num (int): number of courses
+            colors (list[str]): color of each house
+    """
+    span = 1 - 2 * padding
+    for i, house in enumerate(houses_norm):
+        x = pairs[:, 1] + padding + span * house[:, pairs[:, 1]]
+        y = plots_num - 1 - pairs[:, 0] + padding + span * house[:,
+                                                                 pairs[:, 0]]
+        ax.scatter(x.ravel(),
+                   y.ravel(),
+                   color=colors[i],
+                   alpha=0.6,
+                   s=0.5,
+                   linewidths=0)
+
+
+def drawDensity(ax, houses_norm: list[np.ndarray], pairs: np.ndarray,
+                plots_num: int, colors: list[str]) -> None:
+    """Draw every off-diagonal cell as a binned 2D density in a single
+    image. Pixels are colored by the mix of houses in the bin and their
+    opacity grows with the log of the count
+
+        Parameters:
+            ax (matplotlib.axes.Axes): axes to draw on
+            houses_norm (list[np.ndarray]): rescaled values per house
+            pairs (np.ndarray): (row, column) course pairs to draw
+            plots_num (int): number of courses
+            colors (list[str]): color of each house
+    """
+    from matplotlib.colors import to_rgb
+
+    res = density_bins
+    band = res * plots_num * res
+    counts = np.zeros((len(houses_norm), plots_num, band))
+
+    for i, house in enumerate(houses_norm):
+        bins = np.clip((np.nan_to_num(house, nan=-1) * res).astype(int), -1,
+                       res - 1)
+        for row in np.unique(pairs[:, 0]):
+            cols = pairs[pairs[:, 0] == row, 1]
+            idx = (bins[:, [row]] * plots_num + cols) * res + bins[:, cols]
+            valid = (bins[:, [row]] >= 0) & (bins[:, cols] >= 0)
+            counts[i, plots_num - 1 - row] = np.bincount(idx[valid],
+                                                         minlength=band)
+
+    counts = counts.reshape(len(houses_norm), -1)
+    rgb = np.array([to_rgb(color) for color in colors])
+    image = blendDensity(counts, rgb)
+
+    ax.imshow(image.reshape(plots_num * res, plots_num * res, 4),
+              origin='lower',
+              extent=(0, plots_num, 0, plots_num),
+              interpolation='nearest',
+              aspect='auto')
+
+
+def plotPairPlot(houses_raw_data: list,
+                 courses,
+                 houses: list[str],
+                 mode: str = 'auto',
+                 lower: bool = False):
+    """Build the pair plot
 
         Parameters:
             houses_raw_data (list): list of houses data
             courses (list): list of courses
+            houses (list[str]): house of each houses data entry
+            mode (str): auto, scatter or density for off-diagonal cells,
+            auto picks density when the scatter would exceed point_budget
+            lower (bool): only draw the lower triangle
+
+        Returns:
+            matplotlib.figure.Figure: pair plot figure
     """
-    griffindor = houses_raw_data[0]
-    slytherin = houses_raw_data[1]
-    hufflepuff = houses_raw_data[2]
-    ravenclaw = houses_raw_data[3]
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
 
-    courses = courses.to_list()
+    courses = list(courses)
     plots_num = len(courses)
-    fig, axs = plt.subplots(plots_num, plots_num, figsize=(10, 10))
-
-    for course_1 in courses:
-        x = courses.index(course_1)
-        for course_2 in courses:
-            y = courses.index(course_2)
-
-            if course_1 == course_2:
-                data = [
-                    griffindor[course_1], slytherin[course_1],
-                    hufflepuff[course_1], ravenclaw[course_1]
-                ]
-
-                subplotHistogram(axs[x, y], data)
-            else:
-                data_1 = [
-                    griffindor[course_1], slytherin[course_1],
-                    hufflepuff[course_1], ravenclaw[course_1]
-                ]
-
-                data_2 = [
-                    griffindor[course_2], slytherin[course_2],
-                    hufflepuff[course_2], ravenclaw[course_2]
-                ]
-
-                subplotScatter(axs[x, y], data_1, data_2)
-
-            axs[x, y].xaxis.set_ticklabels([])
-            axs[x, y].yaxis.set_ticklabels([])
-
-            if x == plots_num - 1:
-                label = '\n'.join(wrap(course_2, 10))
-                axs[x, y].set_xlabel(label, fontsize=7)
-            if y == 0:
-                label = '\n'.join(wrap(course_1, 10))
-                axs[x, y].set_ylabel(label, fontsize=7)
-
-    fig.canvas.manager.set_window_title('Pair Plot')
-    plt.tight_layout()
-    plt.legend()
+
+    houses_values = [
+        house[courses].to_numpy(dtype=float) for house in houses_raw_data
+    ]
+    values = np.concatenate(houses_values)
+    low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+    houses_norm = [
+        normalizeColumns(house, low, high) for house in houses_values
+    ]
+    pairs = cellPairs(plots_num, lower)
+    colors = houseColors(houses)
+
+    if mode == 'auto':
+        points = len(values) * len(pairs)
+        mode = 'scatter' if points <= point_budget else 'density'
+
+    size = max(10, plots_num * 0.8)
+    fig, ax = plt.subplots(figsize=(size, size), num='Pair Plot')
+
+    if mode == 'density':
+        drawDensity(ax, houses_norm, pairs, plots_num, colors)
+    else:
+        drawScatter(ax, houses_norm, pairs, plots_num, colors)
+    drawHistograms(ax, houses_norm, plots_num, colors)
+
+    grid = np.arange(1, plots_num)
+    ax.vlines(grid, 0, plots_num, color='grey', linewidth=0.3)
+    ax.hlines(grid, 0, plots_num, color='grey', linewidth=0.3)
+    ax.set_xlim(0, plots_num)
+    ax.set_ylim(0, plots_num)
+
+    centers = np.arange(plots_num) + 0.5
+    names = ['\n'.join(wrap(course, 10)) for course in courses]
+    ax.set_xticks(centers, names, fontsize=7)
+    ax.set_yticks(centers[::-1], names, fontsize=7)
+    ax.tick_params(length=0)
+
+    fig.legend(handles=[
+        Patch(color=color, alpha=0.6, label=label)
+        for color, label in zip(colors, houses)
+    ],
+               loc='upper center',
+               ncol=max(len(houses), 1))
+    plt.tight_layout(rect=(0, 0, 1, 0.97))
+    return fig
+
+
+def printPairPlot(houses_raw_data: list,
+                  courses,
+                  houses: list[str],
+                  mode: str = 'auto',
+                  lower: bool = False) -> None:
+    """Show the pair plot
+
+        Parameters:
+            houses_raw_data (list): list of houses data
+            courses (list): list of courses
+            houses (list[str]): house of each houses data entry
+            mode (str): auto, scatter or density for off-diagonal cells
+            lower (bool): only draw the lower triangle
+    """
+    import matplotlib.pyplot as plt
+
+    plotPairPlot(houses_raw_data, courses, houses, mode, lower)
     plt.show()
 
 
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: pair plot settings
+    """
+    parser = argparse.ArgumentParser(description='Pair plot of every course')
+    parser.add_argument('dataset', help='path to the dataset')
+    parser.add_argument('-m',
+                        '--mode',
+                        choices=modes,
+                        default='auto',
+                        help='off-diagonal cells as scatter points or '
+                        'binned density')
+    parser.add_argument('-l',
+                        '--lower',
+                        action='store_true',
+                        help='only draw the lower triangle')
+
+    args = parser.parse_args()
+    check_file(args.dataset)
+
+    return args
+
+
 def main():
     """Main function
     """
-    dataset = parse_input(1, ["dataset.csv"])
-    houses_data, courses = getVisualData(dataset, 0)
-    printPairPlot(houses_data, courses)
+    args = parse_arguments()
+    houses_data, courses, houses = getVisualData(args.dataset, 0)
+    printPairPlot(houses_data, courses, houses, args.mode, args.lower)
 
 
 if __name__ == '__main__':
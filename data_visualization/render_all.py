@@ -0,0 +1,166 @@
+"""Data visualization - Batch rendering
+
+Renders every histogram, every course pair scatter plot and the pair plot
+to image files with the Agg backend, fanned out over a process pool, and
+writes an index.html listing them.
+"""
+from os import sys, path, makedirs
+import re
+import argparse
+import html
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+from histogram import plotHistogram
+from scatter_plot import plotScatter
+from pair_plot import plotPairPlot
+
+sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
+from dslr_extra.utils import getVisualData, check_file
+
+formats = ['png', 'svg']
+worker_data = {}
+
+
+def slugify(text: str) -> str:
+    """Return a file name friendly version of text
+
+        Parameters:
+            text (str): text to convert
+
+        Returns:
+            str: lowercase text with dashes
+    """
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def initWorker(dataset: str) -> None:
+    """Load the dataset once per worker process
+
+        Parameters:
+            dataset (str): path to the dataset
+    """
+    worker_data['houses_data'], worker_data['courses'], worker_data[
+        'houses'] = getVisualData(dataset, 0)
+
+
+def renderTask(task: tuple, output: str, fmt: str, dpi: int) -> str:
+    """Render one figure to a file
+
+        Parameters:
+            task (tuple): kind ('histogram', 'scatter' or 'pair_plot')
+            followed by its courses
+            output (str): output directory
+            fmt (str): image format
+            dpi (int): image resolution
+
+        Returns:
+            str: file name of the rendered figure
+    """
+    kind, *courses = task
+    groups, houses = worker_data['houses_data'], worker_data['houses']
+    houses_data = [[group[course] for group in groups] for course in courses]
+
+    if kind == 'histogram':
+        fig = plotHistogram(houses_data, courses, houses)
+    elif kind == 'scatter':
+        fig = plotScatter(houses_data, courses, houses)
+    else:
+        fig = plotPairPlot(groups, worker_data['courses'], houses)
+
+    name = '_'.join([kind] + [slugify(course) for course in courses])
+    file = f'{name}.{fmt}'
+    fig.savefig(path.join(output, file), dpi=dpi)
+    plt.close(fig)
+
+    return file
+
+
+def writeIndex(output: str, tasks: list[tuple], files: list[str]) -> None:
+    """Write an html index of the rendered figures
+
+        Parameters:
+            output (str): output directory
+            tasks (list[tuple]): rendered tasks
+            files (list[str]): file of each task
+    """
+    sections = {'histogram': [], 'scatter': [], 'pair_plot': []}
+    for task, file in zip(tasks, files):
+        title = html.escape(' vs '.join(task[1:]) or 'Pair Plot')
+        sections[task[0]].append(
+            f'<figure><a href="{file}"><img src="{file}" loading="lazy" '
+            f'width="400"></a><figcaption>{title}</figcaption></figure>')
+
+    with open(path.join(output, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                '<title>dslr report</title></head><body>\n')
+        for section, figures in sections.items():
+            if figures:
+                f.write(f'<h2>{section.replace("_", " ").title()}</h2>\n')
+                f.write('\n'.join(figures) + '\n')
+        f.write('</body></html>\n')
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: rendering settings
+    """
+    parser = argparse.ArgumentParser(
+        description='Render every visualization to image files')
+    parser.add_argument('dataset', help='path to the dataset')
+    parser.add_argument('-o',
+                        '--output',
+                        default='report',
+                        help='output directory')
+    parser.add_argument('-f', '--format', choices=formats, default='png')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=None,
+                        help='number of worker processes (default: cpu count)')
+    parser.add_argument('--dpi', type=int, default=100)
+
+    args = parser.parse_args()
+    check_file(args.dataset)
+
+    return args
+
+
+def main():
+    """Main function
+    """
+    args = parse_arguments()
+    makedirs(args.output, exist_ok=True)
+
+    _, courses, _ = getVisualData(args.dataset, 0)
+    tasks = [('pair_plot', )]
+    tasks += [('histogram', course) for course in courses]
+    tasks += [('scatter', *pair) for pair in combinations(courses, 2)]
+
+    with ProcessPoolExecutor(args.jobs,
+                             initializer=initWorker,
+                             initargs=(args.dataset, )) as executor:
+        futures = [
+            executor.submit(renderTask, task, args.output, args.format,
+                            args.dpi) for task in tasks
+        ]
+        files = [future.result() for future in futures]
+
+    writeIndex(args.output, tasks, files)
+    print(f'{len(files)} figures saved to {args.output}/index.html')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        sys.exit('\nExiting...')
+    except Exception as e:
+        sys.exit(f'Error. {e}')
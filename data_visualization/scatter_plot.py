@@ -1,68 +1,151 @@
 """Data Visualization - Scatter Plot
 """
 from os import sys, path
-import matplotlib.pyplot as plt
+import argparse
+import numpy as np
 
 sys.path.append(path.dirname(path.dirname(path.abspath(__file__))))
-from dslr_extra.utils import getVisualData, parse_input
+from dslr_extra.utils import (getVisualData, check_file, stratifiedSample,
+                              blendDensity, houseColors)
 
+max_points = 20000
+density_bins = 100
 
-def printScatter(houses_data, courses):
-    """Print a scatter plot of the two selected courses
+
+def drawDensity(houses_points: list[np.ndarray], colors: list[str]) -> None:
+    """Draw the points of every house as one binned 2D density image
+
+        Parameters:
+            houses_points (list[np.ndarray]): students x 2 values per house
+            colors (list[str]): color of each house
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_rgb
+
+    points = np.concatenate(houses_points)
+    x_edges = np.histogram_bin_edges(points[:, 0], density_bins)
+    y_edges = np.histogram_bin_edges(points[:, 1], density_bins)
+
+    counts = np.array([
+        np.histogram2d(house[:, 1], house[:, 0],
+                       bins=(y_edges, x_edges))[0].ravel()
+        for house in houses_points
+    ])
+    rgb = np.array([to_rgb(color) for color in colors])
+    image = blendDensity(counts, rgb)
+
+    plt.imshow(image.reshape(density_bins, density_bins, 4),
+               origin='lower',
+               extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+               interpolation='nearest',
+               aspect='auto')
+
+
+def plotScatter(houses_data,
+                courses,
+                houses: list[str],
+                budget: int = max_points,
+                density: bool = False):
+    """Build a scatter plot of the two selected courses. Above budget
+    points, every house is sampled down to its share of the budget
 
         Parameters:
             houses_data (list): list of houses data
             courses (list): list of courses
+            houses (list[str]): house of each houses data entry
+            budget (int): maximum number of points drawn
+            density (bool): draw a binned 2D density instead of points
+
+        Returns:
+            matplotlib.figure.Figure: scatter plot figure
     """
-    colors = ['red', 'green', 'yellow', 'blue']
-    labels = ['Gryffindor', 'Slytherin', 'Hufflepuff', 'Ravenclaw']
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+
+    colors = houseColors(houses)
     houses_data_1, houses_data_2 = houses_data
 
-    plt.figure(num='Scatter Plot')
+    fig = plt.figure(num='Scatter Plot')
     plt.title(courses[0] + ' vs ' + courses[1])
 
-    griffindor = houses_data_1[0], houses_data_2[0]
-    slytherin = houses_data_1[1], houses_data_2[1]
-    hufflepuff = houses_data_1[2], houses_data_2[2]
-    ravenclaw = houses_data_1[3], houses_data_2[3]
-
-    plt.scatter(griffindor[0],
-                griffindor[1],
-                label=labels[0],
-                color=colors[0],
-                alpha=0.6)
-
-    plt.scatter(slytherin[0],
-                slytherin[1],
-                label=labels[1],
-                color=colors[1],
-                alpha=0.6)
-
-    plt.scatter(hufflepuff[0],
-                hufflepuff[1],
-                label=labels[2],
-                color=colors[2],
-                alpha=0.6)
-
-    plt.scatter(ravenclaw[0],
-                ravenclaw[1],
-                label=labels[3],
-                color=colors[3],
-                alpha=0.6)
+    houses_points = []
+    for values_1, values_2 in zip(houses_data_1, houses_data_2):
+        points = np.column_stack((np.asarray(values_1, dtype=float),
+                                  np.asarray(values_2, dtype=float)))
+        houses_points.append(points[~np.isnan(points).any(axis=1)])
+
+    if density:
+        drawDensity(houses_points, colors)
+        plt.legend(handles=[
+            Patch(color=color, alpha=0.6, label=label)
+            for color, label in zip(colors, houses)
+        ])
+    else:
+        for i, points in enumerate(stratifiedSample(houses_points, budget)):
+            plt.scatter(points[:, 0],
+                        points[:, 1],
+                        label=houses[i],
+                        color=colors[i],
+                        alpha=0.6)
+        plt.legend()
 
     plt.grid(alpha=0.2)
     plt.xlabel(courses[0])
     plt.ylabel(courses[1])
-    plt.legend()
+    return fig
+
+
+def printScatter(houses_data,
+                 courses,
+                 houses: list[str],
+                 budget: int = max_points,
+                 density: bool = False):
+    """Print a scatter plot of the two selected courses
+
+        Parameters:
+            houses_data (list): list of houses data
+            courses (list): list of courses
+            houses (list[str]): house of each houses data entry
+            budget (int): maximum number of points drawn
+            density (bool): draw a binned 2D density instead of points
+    """
+    import matplotlib.pyplot as plt
+
+    plotScatter(houses_data, courses, houses, budget, density)
     plt.show()
 
 
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: scatter plot settings
+    """
+    parser = argparse.ArgumentParser(description='Scatter plot of two courses')
+    parser.add_argument('dataset', help='path to the dataset')
+    parser.add_argument('-n',
+                        '--max-points',
+                        type=int,
+                        default=max_points,
+                        help='sample every house down to its share of this '
+                        'many points')
+    parser.add_argument('-d',
+                        '--density',
+                        action='store_true',
+                        help='draw a binned 2D density instead of points')
+
+    args = parser.parse_args()
+    check_file(args.dataset)
+
+    return args
+
+
 def main():
     """"Main function
     """
-    dataset = parse_input(1, ['dataset.csv'])
-    houses_data, courses = getVisualData(dataset, 2)
-    printScatter(houses_data, courses)
+    args = parse_arguments()
+    houses_data, courses, houses = getVisualData(args.dataset, 2)
+    printScatter(houses_data, courses, houses, args.max_points, args.density)
 
 
 if __name__ == '__main__':
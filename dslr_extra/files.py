@@ -0,0 +1,26 @@
+"""File checks
+
+Kept free of third-party imports so every entry point can validate its
+arguments before loading NumPy or pandas.
+"""
+import os
+import sys
+
+
+def check_file(path: str, extensions: tuple[str] = ('.csv',)) -> str:
+    """Check that path is an existing file with a valid extension
+
+        Parameters:
+            path (str): path to the file
+            extensions (tuple[str]): accepted file extensions
+
+        Return:
+            str: path to the file
+    """
+    if not path.endswith(extensions):
+        sys.exit('Error. Invalid dataset')
+
+    if not os.path.isfile(path):
+        sys.exit('Error. Dataset not found')
+
+    return path
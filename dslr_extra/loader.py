@@ -0,0 +1,258 @@
+"""Cached dataset loader
+
+The first time a csv file is loaded it is converted into a binary cache:
+the numeric columns as one column-major .npy matrix and the house as
+categorical codes. Later runs memory-map the cache instead of parsing the
+text again. A cache entry is keyed by the path, size, modification time
+and a hash of the first and last MiB of the file.
+
+The cache lives in $DSLR_CACHE_DIR (default ~/.cache/dslr); setting
+DSLR_CACHE_DIR to an empty string disables it. Every entry is a full
+binary copy of a dataset: writing the entry of a new version of a file
+removes the entries of its previous versions, but entries of files that
+were deleted or moved stay until the directory is cleared. When the
+cache cannot be read or written, a warning is logged and the csv file is
+parsed instead.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+label_column = 'Hogwarts House'
+sample_size = 1 << 20
+logger = logging.getLogger(__name__)
+
+
+def cacheDir() -> str | None:
+    """Return the cache directory, None when caching is disabled
+
+        Returns:
+            str | None: cache directory
+    """
+    path = os.environ.get('DSLR_CACHE_DIR',
+                          os.path.join('~', '.cache', 'dslr'))
+    return os.path.expanduser(path) if path else None
+
+
+def pathKey(dataset: str) -> str:
+    """Return the key shared by the cache entries of every version of a file
+
+        Parameters:
+            dataset (str): path to the dataset
+
+        Returns:
+            str: hex digest of the real path
+    """
+    return hashlib.blake2b(os.path.realpath(dataset).encode(),
+                           digest_size=8).hexdigest()
+
+
+def fileKey(dataset: str) -> str:
+    """Return the cache key of a file
+
+        Parameters:
+            dataset (str): path to the dataset
+
+        Returns:
+            str: hex digest of path, size, mtime and sampled content
+    """
+    info = os.stat(dataset)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(os.path.realpath(dataset).encode())
+    digest.update(f'{info.st_size}:{info.st_mtime_ns}'.encode())
+
+    with open(dataset, 'rb') as file:
+        digest.update(file.read(sample_size))
+        if info.st_size > 2 * sample_size:
+            file.seek(-sample_size, os.SEEK_END)
+            digest.update(file.read(sample_size))
+
+    return digest.hexdigest()
+
+
+def parseDataset(dataset: str, dtype: np.dtype) -> pd.DataFrame:
+    """Parse the csv file into typed columns
+
+        Parameters:
+            dataset (str): path to the dataset
+            dtype (np.dtype): dtype of the numeric columns
+
+        Returns:
+            pd.DataFrame: numeric columns and categorical house
+    """
+    data = pd.read_csv(dataset, index_col=0)
+    labels = data.pop(label_column) if label_column in data else None
+    numeric = data.select_dtypes(include=['number'])
+
+    typed = pd.DataFrame(np.asfortranarray(numeric.to_numpy(dtype=dtype)),
+                         index=data.index,
+                         columns=numeric.columns,
+                         copy=False)
+    if labels is not None:
+        typed.insert(0, label_column, labels.astype('category'))
+
+    return typed
+
+
+def writeCache(data: pd.DataFrame, path: str) -> None:
+    """Write the cache entry of a parsed dataset
+
+        Parameters:
+            data (pd.DataFrame): dataset returned by parseDataset
+            path (str): cache entry directory
+    """
+    labels = data[label_column] if label_column in data else None
+    numeric = data.drop(columns=label_column, errors='ignore')
+
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(path))
+    try:
+        values = numeric.to_numpy()
+        np.save(f'{tmp}/numeric.npy', np.asfortranarray(values))
+        np.save(f'{tmp}/index.npy', data.index.to_numpy(), allow_pickle=True)
+
+        meta = {
+            'version': CACHE_VERSION,
+            'index': data.index.name,
+            'columns': numeric.columns.tolist(),
+            'dtype': values.dtype.name,
+            'categories': None
+        }
+        if labels is not None:
+            meta['categories'] = labels.cat.categories.tolist()
+            np.save(f'{tmp}/labels.npy', labels.cat.codes.to_numpy())
+
+        with open(f'{tmp}/meta.json', 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+
+def pruneCache(root: str, prefix: str, path: str) -> None:
+    """Remove the entries of the previous versions of a file
+
+        Parameters:
+            root (str): cache directory
+            prefix (str): pathKey of the file
+            path (str): entry of the current version, kept with the entries
+            of its other dtypes
+    """
+    current = os.path.basename(path).rsplit('-', 1)[0]
+    for name in os.listdir(root):
+        if name.startswith(f'{prefix}-') and not name.startswith(current):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def readCache(path: str) -> pd.DataFrame:
+    """Memory-map a cache entry
+
+        Parameters:
+            path (str): cache entry directory
+
+        Returns:
+            pd.DataFrame: numeric columns and categorical house
+    """
+    with open(f'{path}/meta.json', 'r', encoding='utf-8') as file:
+        meta = json.load(file)
+
+    numeric = np.load(f'{path}/numeric.npy', mmap_mode='r')
+    index = pd.Index(np.load(f'{path}/index.npy', allow_pickle=True),
+                     name=meta['index'])
+    data = pd.DataFrame(numeric,
+                        index=index,
+                        columns=meta['columns'],
+                        copy=False)
+
+    if meta['categories'] is not None:
+        codes = np.load(f'{path}/labels.npy', mmap_mode='r')
+        labels = pd.Categorical.from_codes(codes, meta['categories'])
+        data.insert(0, label_column, labels)
+
+    return data
+
+
+def loadDataset(dataset: str, dtype: np.dtype = np.float64) -> pd.DataFrame:
+    """Load the numeric columns and the house of a dataset, through the
+    binary cache when enabled
+
+        Parameters:
+            dataset (str): path to the dataset
+            dtype (np.dtype): dtype of the numeric columns
+
+        Returns:
+            pd.DataFrame: numeric columns and categorical house, indexed by
+            the first csv column
+    """
+    root = cacheDir()
+    if root is None:
+        return parseDataset(dataset, dtype)
+
+    try:
+        os.makedirs(root, exist_ok=True)
+        prefix = pathKey(dataset)
+        path = os.path.join(
+            root, f'{prefix}-{fileKey(dataset)}-{np.dtype(dtype).name}')
+
+        if os.path.isdir(path):
+            return readCache(path)
+    except (OSError, ValueError) as e:
+        logger.warning('Dataset cache unavailable, parsing %s: %s', dataset,
+                       e)
+        return parseDataset(dataset, dtype)
+
+    data = parseDataset(dataset, dtype)
+    try:
+        writeCache(data, path)
+        pruneCache(root, prefix, path)
+    except OSError as e:
+        logger.warning('Dataset cache not written for %s: %s', dataset, e)
+    return data
+
+
+def groupIndex(data: pd.DataFrame) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Build the house grouping index of a loaded dataset: rows ordered by
+    house code and the offsets where each house starts
+
+        Parameters:
+            data (pd.DataFrame): dataset returned by loadDataset
+
+        Returns:
+            tuple[list[str], np.ndarray, np.ndarray]: houses, row order and
+            house offsets (len(houses) + 1 values)
+    """
+    labels = data[label_column].astype('category')
+    codes = labels.cat.codes.to_numpy()
+    houses = labels.cat.categories.tolist()
+
+    order = np.argsort(codes, kind='stable')
+    offsets = np.searchsorted(codes[order], np.arange(len(houses) + 1))
+
+    return houses, order, offsets
+
+
+def groupViews(data: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Split a loaded dataset by house. Rows are reordered by house once,
+    every house is then a contiguous slice of that single copy
+
+        Parameters:
+            data (pd.DataFrame): dataset returned by loadDataset
+
+        Returns:
+            dict[str, pd.DataFrame]: rows of each house found in the data
+    """
+    houses, order, offsets = groupIndex(data)
+    grouped = data.take(order)
+
+    return {
+        house: grouped.iloc[offsets[i]:offsets[i + 1]]
+        for i, house in enumerate(houses)
+    }
@@ -0,0 +1,275 @@
+"""Model artifact
+
+This module only needs NumPy: it holds the scoring functions and the
+model IO, so the predictor and the server start without loading the
+training dependencies.
+
+A trained model is stored as a versioned json file holding the weights,
+the bias and the normalization parameters of the training set, so the
+predictor can score any batch (or a single row) consistently. Models
+trained from a previous one (warm start) get the next revision and the
+digest of their parent file.
+
+The same model can be stored in a binary .bin file for fast loading: an
+8 bytes magic, the header length as a little-endian uint32, a json header
+(houses, features, dtype, ...) padded to 64 bytes, then one raw block of
+little-endian floats holding the weights (features x houses, row-major),
+the bias, then the normalization min and max. Loading reads the header
+and memory-maps the block.
+"""
+import os
+import json
+import struct
+import hashlib
+import numpy as np
+
+MODEL_VERSION = 1
+BINARY_MAGIC = b'DSLRMDL1'
+binary_align = 64
+
+
+def sigmoid(x: np.array) -> np.array:
+    """Apply the sigmoid function to x
+
+        Parameters:
+            x (np.array): input values
+
+        Returns:
+            np.array: sigmoid(x)
+    """
+    return 1 / (1 + np.exp(-x))
+
+
+def prediction(x: np.array, w: np.array, b: np.array) -> np.array:
+    """Returns the prediction for x given w and b
+
+        Parameters:
+            x (np.array): dependent variables
+            w (np.array): weights
+            b (np.array): bias
+
+        Returns:
+            np.array: prediction for x
+    """
+    z = np.dot(w.T, x) + b
+    return sigmoid(z)
+
+
+def predict_houses(x: np.array, model: dict) -> tuple[np.array, np.array]:
+    """Score every house at once and pick the most probable one
+
+        Parameters:
+            x (np.array): features x students
+            model (dict): model returned by load_model
+
+        Returns:
+            tuple[np.array, np.array]: house label of each student and
+            probabilities (houses x students)
+    """
+    probabilities = prediction(x, model['w'], model['b'])
+    labels = np.array(model['houses'])[np.argmax(probabilities, axis=0)]
+
+    return labels, probabilities
+
+
+def model_digest(path: str) -> str:
+    """Return the digest identifying a model file
+
+        Parameters:
+            path (str): path to the model file
+
+        Returns:
+            str: hex digest of the file content
+    """
+    with open(path, 'rb') as file:
+        return hashlib.blake2b(file.read(), digest_size=8).hexdigest()
+
+
+def save_model(path: str,
+               houses: list[str],
+               features: list[str],
+               w: np.array,
+               b: np.array,
+               data_min: np.array,
+               data_max: np.array,
+               revision: int = 1,
+               parent: str = None) -> None:
+    """Save the model artifact. float32 weights are stored as float32
+    values and loaded back as float32
+
+        Parameters:
+            path (str): path to the model file
+            houses (list[str]): houses, one per weights column
+            features (list[str]): features, one per weights row
+            w (np.array): weights (features x houses)
+            b (np.array): bias (houses x 1)
+            data_min (np.array): per-feature minimum of the training set
+            data_max (np.array): per-feature maximum of the training set
+            revision (int): number of trainings the model went through
+            parent (str): digest of the model it was trained from
+    """
+    dtype = np.float32 if np.asarray(w).dtype == np.float32 else np.float64
+    model = {
+        'version': MODEL_VERSION,
+        'dtype': np.dtype(dtype).name,
+        'revision': revision,
+        'parent': parent,
+        'houses': list(houses),
+        'features': list(features),
+        'normalization': {
+            'method': 'minmax',
+            'min': np.asarray(data_min, dtype=dtype).tolist(),
+            'max': np.asarray(data_max, dtype=dtype).tolist()
+        },
+        'bias': np.asarray(b, dtype=dtype).reshape(-1).tolist(),
+        'weights': np.asarray(w, dtype=dtype).tolist()
+    }
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(model, file, indent=2)
+
+
+def save_binary_model(path: str, model: dict) -> None:
+    """Save a model returned by load_model in the binary format
+
+        Parameters:
+            path (str): path to the .bin file
+            model (dict): model returned by load_model
+    """
+    w = np.asarray(model['w'])
+    dtype = np.dtype(np.float32 if w.dtype == np.float32 else np.float64)
+    dtype = dtype.newbyteorder('<')
+    normalized = model['min'] is not None
+
+    header = json.dumps({
+        'version': MODEL_VERSION,
+        'dtype': dtype.name,
+        'houses': list(model['houses']),
+        'features': model['features'],
+        'shape': list(w.shape),
+        'normalized': normalized,
+        'revision': model.get('revision', 1),
+        'parent': model.get('parent')
+    }).encode()
+    start = len(BINARY_MAGIC) + 4 + len(header)
+    header += b' ' * (-start % binary_align)
+
+    blocks = [w, model['b']]
+    if normalized:
+        blocks += [model['min'], model['max']]
+    values = np.concatenate(
+        [np.asarray(block, dtype=dtype).reshape(-1) for block in blocks])
+
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as file:
+        file.write(BINARY_MAGIC + struct.pack('<I', len(header)) + header)
+        file.write(values.tobytes())
+    os.replace(tmp, path)
+
+
+def load_binary_model(path: str) -> dict:
+    """Load a binary model, its arrays memory-mapped read-only
+
+        Parameters:
+            path (str): path to the .bin file
+
+        Returns:
+            dict: same keys as load_model
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise Exception(f'{path} is not a binary model')
+        size = struct.unpack('<I', file.read(4))[0]
+        header = json.loads(file.read(size))
+
+    if header['version'] > MODEL_VERSION:
+        raise Exception(f'Unsupported model version {header["version"]}')
+
+    n, k = header['shape']
+    dtype = np.dtype(header['dtype']).newbyteorder('<')
+    count = n * k + k + (2 * n if header['normalized'] else 0)
+    values = np.memmap(path,
+                       dtype=dtype,
+                       mode='r',
+                       offset=len(BINARY_MAGIC) + 4 + size,
+                       shape=(count, ))
+
+    model = {
+        'version': header['version'],
+        'houses': header['houses'],
+        'features': header['features'],
+        'w': values[:n * k].reshape(n, k),
+        'b': values[n * k:n * k + k].reshape(k, 1),
+        'min': None,
+        'max': None,
+        'revision': header['revision'],
+        'parent': header['parent']
+    }
+    if header['normalized']:
+        model['min'] = values[n * k + k:n * k + k + n]
+        model['max'] = values[n * k + k + n:]
+
+    return model
+
+
+def convert_model(source: str, destination: str) -> None:
+    """Convert a model.json or legacy weights.csv to the binary format
+
+        Parameters:
+            source (str): path to the model to convert
+            destination (str): path to the .bin file
+    """
+    save_binary_model(destination, load_model(source))
+
+
+def load_model(path: str) -> dict:
+    """Load a model artifact or a legacy weights.csv
+
+    Legacy weights.csv files have the bias in row 0, one column per house
+    and no feature names nor normalization parameters, so 'features',
+    'min' and 'max' are None for them. Binary .bin models are memory-mapped.
+
+        Parameters:
+            path (str): path to the model file
+
+        Returns:
+            dict: houses, features, w (features x houses), b (houses x 1),
+            min, max, revision and parent
+    """
+    if os.path.splitext(path)[1] == '.bin':
+        return load_binary_model(path)
+
+    if os.path.splitext(path)[1] == '.csv':
+        with open(path, 'r', encoding='utf-8') as file:
+            houses = file.readline().strip().split(',')
+        values = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+        return {
+            'version': 0,
+            'houses': houses,
+            'features': None,
+            'w': values[1:],
+            'b': values[:1].T,
+            'min': None,
+            'max': None,
+            'revision': 1,
+            'parent': None
+        }
+
+    with open(path, 'r', encoding='utf-8') as file:
+        model = json.load(file)
+
+    if model.get('version', 0) > MODEL_VERSION:
+        raise Exception(f'Unsupported model version {model["version"]}')
+
+    dtype = np.dtype(model.get('dtype', 'float64'))
+    return {
+        'version': model['version'],
+        'houses': model['houses'],
+        'features': model['features'],
+        'w': np.array(model['weights'], dtype=dtype),
+        'b': np.array(model['bias'], dtype=dtype).reshape(-1, 1),
+        'min': np.array(model['normalization']['min'], dtype=dtype),
+        'max': np.array(model['normalization']['max'], dtype=dtype),
+        'revision': model.get('revision', 1),
+        'parent': model.get('parent')
+    }
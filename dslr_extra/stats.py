@@ -0,0 +1,339 @@
+"""Describe engine
+
+Vectorized statistics over a numeric matrix (one column per feature).
+Every column is sorted once and all the order statistics are read from
+that single sort.
+"""
+import numpy as np
+
+default_percentiles = [25, 50, 75]
+
+
+def percentile_label(percentile: float) -> str:
+    """Return the describe row label of a percentile
+
+        Parameters:
+            percentile (float): percentile between 0 and 100
+
+        Returns:
+            str: label such as '25%'
+    """
+    return f'{percentile:g}%'
+
+
+def percentiles_from_sorted(sorted_values: np.ndarray, count: np.ndarray,
+                            percentiles: list[float]) -> np.ndarray:
+    """Interpolate percentiles from columns sorted with NaNs last
+
+    The rank of a percentile is percentile / 100 * count. The value is read
+    at the integer part of the rank and linearly interpolated towards the
+    next value with the decimal part.
+
+        Parameters:
+            sorted_values (np.ndarray): columns sorted in ascending order
+            count (np.ndarray): non null values of each column
+            percentiles (list[float]): percentiles between 0 and 100
+
+        Returns:
+            np.ndarray: percentiles x columns
+    """
+    columns = np.arange(sorted_values.shape[1])
+    last = np.maximum(count - 1, 0)
+    results = np.full((len(percentiles), sorted_values.shape[1]), np.nan)
+
+    for i, percentile in enumerate(percentiles):
+        rank = percentile / 100 * count
+        rank_decimal = rank % 1
+        rank_rounded = (rank - rank_decimal).astype(int)
+
+        lower_idx = np.minimum(rank_rounded, last)
+        upper_idx = np.where(rank_rounded + 1 >= count, lower_idx,
+                             rank_rounded + 1)
+
+        lower = sorted_values[lower_idx, columns]
+        upper = sorted_values[upper_idx, columns]
+        results[i] = lower + rank_decimal * (upper - lower)
+
+    results[:, count == 0] = np.nan
+    return results
+
+
+def describe(values: np.ndarray,
+             percentiles: list[float] = None) -> dict[str, np.ndarray]:
+    """Compute count, mean, std, min, percentiles and max of every column
+
+        Parameters:
+            values (np.ndarray): students x columns, NaN for missing values
+            percentiles (list[float]): percentiles between 0 and 100
+
+        Returns:
+            dict[str, np.ndarray]: one array per statistic, in describe order
+    """
+    if percentiles is None:
+        percentiles = default_percentiles
+
+    values = np.asarray(values, dtype=float)
+    if values.shape[0] == 0:
+        values = np.full((1, values.shape[1]), np.nan)
+
+    count = np.sum(~np.isnan(values), axis=0)
+    valid = count != 0
+    size = np.where(valid, count, 1)
+
+    mean = np.where(valid, np.nansum(values, axis=0) / size, np.nan)
+    variance = np.nansum((values - mean)**2, axis=0) / size
+    std = np.where(valid, np.sqrt(variance), np.nan)
+
+    sorted_values = np.sort(values, axis=0)
+    columns = np.arange(values.shape[1])
+    minimum = np.where(valid, sorted_values[0], np.nan)
+    maximum = np.where(valid, sorted_values[size - 1, columns], np.nan)
+
+    stats = {'count': count, 'mean': mean, 'std': std, 'min': minimum}
+    results = percentiles_from_sorted(sorted_values, count, percentiles)
+    for percentile, result in zip(percentiles, results):
+        stats[percentile_label(percentile)] = result
+    stats['max'] = maximum
+
+    return stats
+
+
+def moments(values: np.ndarray) -> dict[str, np.ndarray]:
+    """Count, mean, sum of squared deviations, min and max of every column
+
+        Parameters:
+            values (np.ndarray): students x columns, NaN for missing values
+
+        Returns:
+            dict[str, np.ndarray]: mergeable moments
+    """
+    count = np.sum(~np.isnan(values), axis=0)
+    valid = count != 0
+    mean = np.where(valid,
+                    np.nansum(values, axis=0) / np.where(valid, count, 1),
+                    np.nan)
+
+    return {
+        'count': count,
+        'mean': mean,
+        'm2': np.nansum((values - mean)**2, axis=0),
+        'min': np.fmin.reduce(values, axis=0, initial=np.nan),
+        'max': np.fmax.reduce(values, axis=0, initial=np.nan)
+    }
+
+
+def merge_moments(a: dict[str, np.ndarray],
+                  b: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Merge two sets of moments with the parallel algorithm of Chan et al.
+
+        Parameters:
+            a (dict[str, np.ndarray]): moments of a first part of the data
+            b (dict[str, np.ndarray]): moments of a second part of the data
+
+        Returns:
+            dict[str, np.ndarray]: moments of both parts
+    """
+    count = a['count'] + b['count']
+    size = np.where(count != 0, count, 1)
+    delta = np.nan_to_num(b['mean']) - np.nan_to_num(a['mean'])
+    mean = np.nan_to_num(a['mean']) + delta * b['count'] / size
+    m2 = a['m2'] + b['m2'] + delta**2 * a['count'] * b['count'] / size
+
+    return {
+        'count': count,
+        'mean': np.where(count != 0, mean, np.nan),
+        'm2': m2,
+        'min': np.fmin(a['min'], b['min']),
+        'max': np.fmax(a['max'], b['max'])
+    }
+
+
+class QuantileSketch:
+    """Mergeable KLL quantile sketch of one column
+
+    Level h stores items standing for 2^h values. A full level is sorted and
+    every other item, starting at a random offset, is promoted to the next
+    level. Level capacities shrink geometrically below the top one, which
+    keeps the normalized rank error around 1.7 / k.
+    """
+
+    def __init__(self, k: int = 200, seed=0) -> None:
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def capacity(self, level: int) -> int:
+        """Return the capacity of a level
+
+            Parameters:
+                level (int): level number
+
+            Returns:
+                int: number of items the level can hold
+        """
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3)**depth)))
+
+    def compress(self) -> None:
+        """Compact every level over its capacity
+        """
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+
+                items = np.sort(items)
+                kept = items[len(items) - len(items) % 2:]
+                offset = self.rng.integers(2)
+                promoted = items[offset:len(items) - len(items) % 2:2]
+
+                self.levels[level] = kept
+                self.levels[level + 1] = np.concatenate(
+                    (self.levels[level + 1], promoted))
+            level += 1
+
+    def update(self, values: np.ndarray) -> None:
+        """Add values, NaNs are ignored
+
+            Parameters:
+                values (np.ndarray): new values of the column
+        """
+        values = values[~np.isnan(values)]
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self.compress()
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Merge another sketch of the same column into this one
+
+            Parameters:
+                other (QuantileSketch): sketch to merge
+        """
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.compress()
+
+    def values_at(self, positions: np.ndarray) -> np.ndarray:
+        """Estimate the values at 0-based positions of the sorted column
+
+            Parameters:
+                positions (np.ndarray): positions in the sorted column
+
+            Returns:
+                np.ndarray: estimated values
+        """
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return np.full(len(positions), np.nan)
+
+        weights = np.concatenate([
+            np.full(len(items), 2**level)
+            for level, items in enumerate(self.levels)
+        ])
+        order = np.argsort(items, kind='stable')
+        cumulative = np.cumsum(weights[order])
+
+        idx = np.searchsorted(cumulative, positions, side='right')
+        return items[order][np.minimum(idx, len(items) - 1)]
+
+
+def sketch_size(error: float) -> int:
+    """Return the sketch parameter k for a target normalized rank error
+
+        Parameters:
+            error (float): target rank error, e.g. 0.01 for 1%
+
+        Returns:
+            int: sketch parameter k
+    """
+    return max(8, int(np.ceil(1.7 / error)))
+
+
+def partial_describe(values: np.ndarray, k: int, seed=0) -> tuple:
+    """Mergeable statistics of a block of rows. Every block must get its
+    own seed: sketches sharing a random stream make the same compaction
+    choices and their rank errors add up instead of cancelling out
+
+        Parameters:
+            values (np.ndarray): students x columns, NaN for missing values
+            k (int): sketch parameter
+            seed (int | tuple): entropy of the sketches random streams,
+            e.g. the position of the block in the file
+
+        Returns:
+            tuple: moments and one quantile sketch per column
+    """
+    seeds = np.random.SeedSequence(seed).spawn(values.shape[1])
+    sketches = [QuantileSketch(k, column_seed) for column_seed in seeds]
+    for column, sketch in enumerate(sketches):
+        sketch.update(values[:, column])
+
+    return moments(values), sketches
+
+
+def merge_partial(a: tuple, b: tuple) -> tuple:
+    """Merge two partial_describe results
+
+        Parameters:
+            a (tuple): statistics of a first block of rows
+            b (tuple): statistics of a second block of rows
+
+        Returns:
+            tuple: statistics of both blocks
+    """
+    for sketch, other in zip(a[1], b[1]):
+        sketch.merge(other)
+
+    return merge_moments(a[0], b[0]), a[1]
+
+
+def finalize_describe(partial: tuple,
+                      percentiles: list[float] = None
+                      ) -> dict[str, np.ndarray]:
+    """Turn merged partial statistics into the describe statistics
+
+    Percentiles follow the same rank interpolation as describe(), with the
+    values at each rank estimated by the sketches.
+
+        Parameters:
+            partial (tuple): merged partial_describe results
+            percentiles (list[float]): percentiles between 0 and 100
+
+        Returns:
+            dict[str, np.ndarray]: one array per statistic, in describe order
+    """
+    if percentiles is None:
+        percentiles = default_percentiles
+
+    stats_moments, sketches = partial
+    count = stats_moments['count']
+    valid = count != 0
+    size = np.where(valid, count, 1)
+
+    stats = {
+        'count': count,
+        'mean': stats_moments['mean'],
+        'std': np.where(valid, np.sqrt(stats_moments['m2'] / size), np.nan),
+        'min': stats_moments['min']
+    }
+
+    for percentile in percentiles:
+        rank = percentile / 100 * count
+        rank_decimal = rank % 1
+        rank_rounded = (rank - rank_decimal).astype(int)
+        lower_idx = np.minimum(rank_rounded, np.maximum(count - 1, 0))
+        upper_idx = np.where(rank_rounded + 1 >= count, lower_idx,
+                             rank_rounded + 1)
+
+        result = np.full(len(sketches), np.nan)
+        for column, sketch in enumerate(sketches):
+            lower, upper = sketch.values_at(
+                np.array([lower_idx[column], upper_idx[column]]))
+            result[column] = lower + rank_decimal[column] * (upper - lower)
+        stats[percentile_label(percentile)] = np.where(valid, result, np.nan)
+
+    stats['max'] = stats_moments['max']
+    return stats
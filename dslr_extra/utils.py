@@ -4,6 +4,15 @@ import os
 import sys
 import pandas as pd
 import numpy as np
+from dslr_extra.loader import loadDataset, groupViews, label_column
+from dslr_extra.files import check_file
+
+house_colors = {
+    'Gryffindor': 'red',
+    'Slytherin': 'green',
+    'Hufflepuff': 'yellow',
+    'Ravenclaw': 'blue'
+}
 
 
 def parse_input(argc: int, args: list[str]) -> str | tuple[str]:
@@ -18,30 +27,129 @@ def parse_input(argc: int, args: list[str]) -> str | tuple[str]:
         sys.exit(msg)
 
     for arg in sys.argv[1:]:
-        if not arg.endswith('.csv'):
-            sys.exit('Error. Invalid dataset')
-
-        if not os.path.isfile(arg):
-            sys.exit('Error. Dataset not found')
+        check_file(arg)
 
     if argc == 1:
         return sys.argv[1]
     return [sys.argv[1], sys.argv[2]]
 
 
-def normalizeData(data: pd.DataFrame) -> pd.DataFrame:
+def normalizeData(data: pd.DataFrame,
+                  data_min: pd.Series = None,
+                  data_max: pd.Series = None) -> pd.DataFrame:
     """Convert data to a range between 0 and 1
 
         Parameters:
             data (pd.DataFrame): data to normalize
+            data_min (pd.Series): per-column minimum, computed from data when
+            not given
+            data_max (pd.Series): per-column maximum, computed from data when
+            not given
 
         Returns:
             pd.DataFrame: normalized data
     """
-    data_norm = (data - data.min()) / (data.max() - data.min())
+    if data_min is None:
+        data_min = data.min()
+    if data_max is None:
+        data_max = data.max()
+
+    data_norm = (data - data_min) / (data_max - data_min)
     return data_norm
 
 
+def split_csv(dataset: str, parts: int) -> list[tuple[int, int]]:
+    """Split a csv file into byte ranges aligned to line boundaries. The
+    header line is left out of every range
+
+        Parameters:
+            dataset (str): path to the dataset
+            parts (int): number of ranges wanted
+
+        Returns:
+            list[tuple[int, int]]: start and end offsets of each range
+    """
+    size = os.path.getsize(dataset)
+
+    with open(dataset, 'rb') as file:
+        file.readline()
+        start = file.tell()
+        bounds = [start]
+
+        for i in range(1, parts):
+            file.seek(max(start + (size - start) * i // parts, bounds[-1]))
+            if file.tell() != start:
+                file.readline()
+            bounds.append(min(file.tell(), size))
+
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+class ShardReader:
+    """File-like object reading the csv header then one byte range
+    """
+
+    def __init__(self, dataset: str, start: int, end: int) -> None:
+        self.file = open(dataset, 'rb')
+        self.header = self.file.readline()
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def read(self, size: int = -1) -> bytes:
+        """Read at most size bytes, header first
+
+            Parameters:
+                size (int): number of bytes, -1 for everything
+
+            Returns:
+                bytes: data read
+        """
+        if size < 0:
+            size = len(self.header) + self.remaining
+
+        data = self.header[:size]
+        self.header = self.header[size:]
+        size = min(size - len(data), self.remaining)
+        if size > 0:
+            chunk = self.file.read(size)
+            self.remaining -= len(chunk)
+            data += chunk
+
+        return data
+
+    def close(self) -> None:
+        """Close the underlying file
+        """
+        self.file.close()
+
+
+def readCsvChunks(dataset: str,
+                  chunksize: int,
+                  shard: tuple[int, int] = None,
+                  **kwargs):
+    """Read a csv file, or one of its split_csv ranges, in chunks
+
+        Parameters:
+            dataset (str): path to the dataset
+            chunksize (int): number of rows read at once
+            shard (tuple[int, int]): byte range to read, whole file if None
+            kwargs: extra pd.read_csv arguments
+
+        Yields:
+            pd.DataFrame: chunks of the file
+    """
+    if shard is None:
+        yield from pd.read_csv(dataset, chunksize=chunksize, **kwargs)
+        return
+
+    reader = ShardReader(dataset, *shard)
+    try:
+        yield from pd.read_csv(reader, chunksize=chunksize, **kwargs)
+    finally:
+        reader.close()
+
+
 def ask_user_for_courses(columns: list, input_count: int) -> tuple:
     """Ask user for #input_count courses and return a tuple with the
     selected ones
@@ -87,10 +195,65 @@ def getNumericData(dataset: str) -> pd.DataFrame:
         Returns:
             pd.DataFrame: numeric data for data_analysis script
     """
-    raw_data = pd.read_csv(dataset, index_col=0)
+    raw_data = loadDataset(dataset)
     return raw_data.select_dtypes(include=['number'])
 
 
+def getNumericChunks(dataset: str,
+                     chunksize: int,
+                     shard: tuple[int, int] = None,
+                     columns: list[str] = None):
+    """Read the numeric data for data_analysis script in chunks
+
+        Parameters:
+            dataset (str): path to the dataset
+            chunksize (int): number of rows read at once
+            shard (tuple[int, int]): byte range to read, whole file if None
+            columns (list[str]): numeric columns, taken from the first chunk
+            if None. The house column is never one of them, like in
+            getNumericData, even when it is empty
+
+        Yields:
+            pd.DataFrame: numeric columns of each chunk
+    """
+    for chunk in readCsvChunks(dataset, chunksize, shard, index_col=0):
+        if columns is None:
+            columns = chunk.drop(columns=label_column, errors='ignore')
+            columns = columns.select_dtypes(include=['number']).columns
+        yield chunk[columns].astype(float)
+
+
+def orderHouses(houses: list[str]) -> list[str]:
+    """Order houses with the four Hogwarts houses first, then any other
+    label found in the data
+
+        Parameters:
+            houses (list[str]): houses found in the data
+
+        Returns:
+            list[str]: ordered houses
+    """
+    known = list(house_colors)
+    return sorted(houses,
+                  key=lambda house: (known.index(house)
+                                     if house in known else len(known), house))
+
+
+def houseColors(houses: list[str]) -> list[str]:
+    """Return the plot color of each house, labels other than the four
+    Hogwarts houses get matplotlib cycle colors
+
+        Parameters:
+            houses (list[str]): houses to color
+
+        Returns:
+            list[str]: one matplotlib color per house
+    """
+    return [
+        house_colors.get(house, f'C{i % 10}') for i, house in enumerate(houses)
+    ]
+
+
 def getVisualData(dataset: str, input_count: int) -> tuple:
     """Get data for data_visualization scripts
 
@@ -99,52 +262,196 @@ def getVisualData(dataset: str, input_count: int) -> tuple:
             input_count (int): number of courses to select
 
         Returns:
-            tuple: tuple of houses data and selected courses
+            tuple: tuple of houses data, selected courses and houses
     """
 
-    raw_data = pd.read_csv(dataset, index_col=0)
+    raw_data = loadDataset(dataset)
     numeric_data = raw_data.select_dtypes(include=['number'])
 
-    griffindor = raw_data.query("`Hogwarts House` == 'Gryffindor'")
-    slytherin = raw_data.query("`Hogwarts House` == 'Slytherin'")
-    hufflepuff = raw_data.query("`Hogwarts House` == 'Hufflepuff'")
-    ravenclaw = raw_data.query("`Hogwarts House` == 'Ravenclaw'")
+    groups = groupViews(raw_data)
+    houses = orderHouses(list(groups))
 
     if input_count == 0:
         courses = numeric_data.columns
-        houses_data = [griffindor, slytherin, hufflepuff, ravenclaw]
-        return houses_data, courses
+        houses_data = [groups[house] for house in houses]
+        return houses_data, courses, houses
 
     courses = ask_user_for_courses(numeric_data.columns, input_count)
 
     houses_data = []
     for course in courses:
-        houses_data.append([
-            griffindor[course], slytherin[course], hufflepuff[course],
-            ravenclaw[course]
-        ])
+        houses_data.append([groups[house][course] for house in houses])
+
+    return houses_data, courses, houses
+
+
+def stratifiedSample(groups: list[np.ndarray],
+                     budget: int,
+                     seed: int = 0) -> list[np.ndarray]:
+    """Pick at most budget rows over all groups, each group keeping its
+    share of the rows
+
+        Parameters:
+            groups (list[np.ndarray]): arrays sampled along their first axis
+            budget (int): maximum number of rows kept in total
+            seed (int): random seed
+
+        Returns:
+            list[np.ndarray]: sampled arrays, unchanged when under budget
+    """
+    total = sum(len(group) for group in groups)
+    if total <= budget:
+        return groups
+
+    rng = np.random.default_rng(seed)
+    samples = []
+    for group in groups:
+        size = max(1, round(budget * len(group) / total)) if len(group) else 0
+        idx = np.sort(rng.choice(len(group), size, replace=False))
+        samples.append(group[idx])
+
+    return samples
 
-    return houses_data, courses
 
+def blendDensity(counts: np.ndarray, rgb: np.ndarray) -> np.ndarray:
+    """Turn per-group bin counts into RGBA pixels. A pixel is colored by
+    the mix of groups in its bin and its opacity grows with the log of the
+    bin count
 
-def getLRData(dataset: str, house: str) -> tuple[np.array]:
+        Parameters:
+            counts (np.ndarray): groups x bins counts
+            rgb (np.ndarray): groups x 3 colors
+
+        Returns:
+            np.ndarray: bins x 4 RGBA values
+    """
+    total = counts.sum(axis=0)
+    image = np.zeros((counts.shape[1], 4))
+    filled = total > 0
+    if not filled.any():
+        return image
+
+    image[filled, :3] = (counts[:, filled].T @ rgb) / total[filled, None]
+    image[filled, 3] = 0.25 + 0.75 * np.log1p(total[filled]) / np.log1p(
+        total.max())
+
+    return image
+
+
+def getLRData(dataset: str,
+              houses: list[str],
+              dtype: np.dtype = np.float64,
+              stats: tuple = None) -> tuple:
     """Get data for logistic_regression scripts
 
         Parameters:
             dataset (str): path to the dataset
-            input_count (int): number of courses to select
+            houses (list[str]): houses to build the one-vs-rest labels for
+            dtype (np.dtype): dtype of x, y and the normalization parameters
+            stats (tuple): features, min and max to normalize with, taken
+            from the dataset when None
+
+        Returns:
+            tuple: x (features x students) and y (houses x students) data
+            ready for lr, plus the features, min and max used to normalize
+    """
+    data = loadDataset(dataset, dtype)
+    if stats is None:
+        values = data.select_dtypes(include=['number']).fillna(0)
+        data_min, data_max = values.min(), values.max()
+    else:
+        values = data[stats[0]].fillna(0)
+        data_min, data_max = stats[1].astype(dtype), stats[2].astype(dtype)
+    X = normalizeData(values, data_min, data_max)
+    labels = data['Hogwarts House']
+
+    x = X.values.T
+    y = np.array([(labels == house).values for house in houses]).astype(dtype)
+
+    return x, y, (values.columns.tolist(), data_min, data_max)
+
+
+def getLRFeatures(dataset: str, chunksize: int = None) -> list[str]:
+    """Get the logistic_regression feature columns of a dataset, the rows
+    of the legacy weights.csv layout
+
+        Parameters:
+            dataset (str): path to the dataset
+            chunksize (int): detect them on the first chunk of this many
+            rows like getLRStats, on the whole dataset like getLRData if None
 
         Returns:
-            tuple[np.array]: x and y data ready for lr
+            list[str]: numeric columns of the dataset
     """
-    data = pd.read_csv(dataset, index_col=0)
-    X = normalizeData(data.select_dtypes(include=['number']).fillna(0))
-    Y = data['Hogwarts House'].apply(lambda x: 1 if x == house else 0)
+    if chunksize is None:
+        data = loadDataset(dataset)
+    else:
+        data = next(pd.read_csv(dataset, index_col=0, chunksize=chunksize))
+
+    return data.select_dtypes(include=['number']).columns.tolist()
+
+
+def getLRStats(
+        dataset: str,
+        chunksize: int,
+        dtype: np.dtype = np.float64) -> tuple[list[str], pd.Series, pd.Series]:
+    """Streaming pass over the dataset to get the normalization parameters
+    of the logistic_regression features without loading the whole file
+
+        Parameters:
+            dataset (str): path to the dataset
+            chunksize (int): number of rows read at once
+            dtype (np.dtype): dtype of the features
 
-    x_array = X.values
-    y_array = Y.values
+        Returns:
+            tuple[list[str], pd.Series, pd.Series]: features, min and max
+    """
+    features, data_min, data_max = None, None, None
+
+    for chunk in pd.read_csv(dataset, index_col=0, chunksize=chunksize):
+        if features is None:
+            features = chunk.select_dtypes(include=['number']).columns.tolist()
+            data_min = pd.Series(np.inf, index=features)
+            data_max = pd.Series(-np.inf, index=features)
+
+        values = chunk[features].astype(dtype).fillna(0)
+        data_min = np.fmin(data_min, values.min())
+        data_max = np.fmax(data_max, values.max())
+
+    if features is None:
+        raise Exception('Dataset is empty')
+
+    return features, data_min.astype(dtype), data_max.astype(dtype)
+
+
+def getLRChunks(dataset: str,
+                houses: list[str],
+                features: list[str],
+                data_min: pd.Series,
+                data_max: pd.Series,
+                chunksize: int,
+                dtype: np.dtype = np.float64):
+    """Read the dataset in chunks and yield them ready for lr
+
+        Parameters:
+            dataset (str): path to the dataset
+            houses (list[str]): houses to build the one-vs-rest labels for
+            features (list[str]): feature columns
+            data_min (pd.Series): per-feature minimum
+            data_max (pd.Series): per-feature maximum
+            chunksize (int): number of rows read at once
+            dtype (np.dtype): dtype of x and y
+
+        Yields:
+            tuple[np.array]: x (features x students) and y (houses x students)
+            for each chunk
+    """
+    for chunk in pd.read_csv(dataset, index_col=0, chunksize=chunksize):
+        values = chunk[features].astype(dtype).fillna(0)
+        X = normalizeData(values, data_min, data_max)
+        labels = chunk['Hogwarts House']
 
-    x = x_array.T
-    y = y_array.reshape(1, x.shape[1])
+        x = X.values.T
+        y = np.array([(labels == house).values for house in houses]).astype(dtype)
 
-    return x, y
+        yield x, y
@@ -0,0 +1,54 @@
+"""Logistic Regression - Model conversion
+
+Converts a model.json or a legacy weights.csv to the binary .bin format,
+which the predictor and the server load by memory-mapping.
+"""
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dslr_extra.files import check_file
+from dslr_extra.model import convert_model
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: conversion settings
+    """
+    parser = argparse.ArgumentParser(
+        description='Convert a model to the binary format')
+    parser.add_argument('model', help='path to model.json or weights.csv')
+    parser.add_argument('output',
+                        nargs='?',
+                        help='path to the .bin file (default: next to the '
+                        'model)')
+
+    args = parser.parse_args()
+    check_file(args.model, ('.json', '.csv'))
+    if args.output is None:
+        args.output = f'{os.path.splitext(args.model)[0]}.bin'
+    elif not args.output.endswith('.bin'):
+        parser.error('output must be a .bin file')
+
+    return args
+
+
+def main() -> None:
+    """Main function
+    """
+    args = parse_arguments()
+    convert_model(args.model, args.output)
+    print(f'Model converted to {args.output}')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        sys.exit('\nExiting...')
+    except Exception as e:
+        sys.exit(f'Error. {e}')
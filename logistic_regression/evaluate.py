@@ -1,54 +1,257 @@
-"""
-Put these files in the same folder as `houses.csv` and `dataset_truth.csv`.
+"""Logistic Regression - Evaluate
+
+Compares predictions with the truth, joined on Index. Both files default
+to `results/dataset_truth.csv` and `results/houses.csv`.
 
 Usage:
-    $ python evaluate.py
+    $ python evaluate.py [truth.csv] [houses.csv] [-p probabilities.csv]
 """
-import csv
+import os
 import sys
-import os.path
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dslr_extra.utils import check_file, orderHouses
+
+label_column = 'Hogwarts House'
+tiny = 1e-15
 
 color_d = "\033[0m"
 color_g = "\033[92m"
 color_r = "\033[91m"
+color_grey = "\033[90m"
 
 
-def load_csv(filename):
-    """Load a CSV file and return a list with datas (corresponding to truths or
-    predictions).
+def read_chunks(path: str, chunksize: int = None):
+    """Read a csv file indexed by its first column, whole or in chunks
+
+        Parameters:
+            path (str): path to the csv file
+            chunksize (int): number of rows read at once, whole file if None
+
+        Returns:
+            iterable of pd.DataFrame
     """
-    datas = []
-    with open(filename, 'r', encoding='utf-8') as opened_csv:
-        read_csv = csv.reader(opened_csv, delimiter=',')
-        for line in read_csv:
-            datas.append(line[1])
-    # Clean the header cell
-    datas.remove("Hogwarts House")
-    return datas
+    if chunksize is None:
+        return [pd.read_csv(path, index_col=0)]
 
+    return pd.read_csv(path, index_col=0, chunksize=chunksize)
 
-if __name__ == '__main__':
-    path = os.path.dirname(os.path.realpath(__file__))
 
-    if os.path.isfile(f"{path}/results/dataset_truth.csv"):
-        truths = load_csv(f"{path}/results/dataset_truth.csv")
-    else:
-        sys.exit("Error: missing dataset_truth.csv in the current directory.")
-    if os.path.isfile(f"{path}/results/houses.csv"):
-        predictions = load_csv(f"{path}/results/houses.csv")
-    else:
-        sys.exit("Error: missing houses.csv in the current directory.")
+def load_truth(path: str) -> tuple[pd.Series, list[str]]:
+    """Load the true house of every student
+
+        Parameters:
+            path (str): path to the truth csv file
+
+        Returns:
+            tuple[pd.Series, list[str]]: house codes indexed by Index and
+            the houses they refer to
+    """
+    labels = pd.read_csv(path, index_col=0, usecols=[0, 1])[label_column]
+    houses = orderHouses(labels.dropna().unique().tolist())
+    codes = pd.Categorical(labels, categories=houses).codes
+
+    return pd.Series(codes, index=labels.index), houses
+
+
+def confusion_matrix(truth: pd.Series, houses: list[str], chunks) -> tuple:
+    """Accumulate the confusion matrix over chunks of predictions
+
+        Parameters:
+            truth (pd.Series): house codes indexed by Index
+            houses (list[str]): houses of the codes
+            chunks: iterable of prediction chunks
+
+        Returns:
+            tuple: truth x prediction counts, with an Other column counting
+            predicted labels that are not a known house and a Missing
+            column counting students without prediction, and the number
+            of predictions without truth
+    """
+    k = len(houses)
+    matrix = np.zeros(k * (k + 1), dtype=np.int64)
+    unmatched = 0
+
+    for chunk in chunks:
+        true = truth.reindex(chunk.index).to_numpy()
+        predicted = pd.Categorical(chunk[label_column],
+                                   categories=houses).codes
+        predicted = np.where(predicted < 0, k, predicted)
+
+        matched = ~np.isnan(true) & (true >= 0)
+        unmatched += np.count_nonzero(np.isnan(true))
+        matrix += np.bincount(true[matched].astype(np.int64) * (k + 1) +
+                              predicted[matched],
+                              minlength=k * (k + 1))
+
+    matrix = matrix.reshape(k, k + 1)
+    codes = truth.to_numpy()
+    support = np.bincount(codes[codes >= 0], minlength=k)
+    missing = np.maximum(support - matrix.sum(axis=1), 0)
+
+    return np.column_stack((matrix, missing)), unmatched
+
+
+def log_loss(truth: pd.Series, houses: list[str], chunks) -> float:
+    """Accumulate the log-loss of the probabilities over chunks. The one-vs
+    -rest probabilities of every student are rescaled to sum to 1
+
+        Parameters:
+            truth (pd.Series): house codes indexed by Index
+            houses (list[str]): houses of the codes
+            chunks: iterable of probabilities chunks, one column per house
+
+        Returns:
+            float: mean negative log probability of the true house
+    """
+    total, count = 0.0, 0
+
+    for chunk in chunks:
+        true = truth.reindex(chunk.index).to_numpy()
+        matched = ~np.isnan(true) & (true >= 0)
+
+        p = chunk[houses].to_numpy(dtype=float)[matched]
+        p /= np.maximum(p.sum(axis=1, keepdims=True), tiny)
+        p_true = p[np.arange(len(p)), true[matched].astype(np.int64)]
+
+        total += -np.sum(np.log(np.maximum(p_true, tiny)))
+        count += len(p)
 
-    count = 0
-    if len(truths) == len(predictions):
-        for i, truth in enumerate(truths):
-            if truth == predictions[i]:
-                count += 1
-    score = float(count) / len(truths) * 100
+    return total / max(count, 1)
 
+
+def house_scores(matrix: np.array, houses: list[str]) -> pd.DataFrame:
+    """Compute precision, recall and F1 of every house. Support comes from
+    the truth, so students without prediction count as misses
+
+        Parameters:
+            matrix (np.array): confusion matrix from confusion_matrix
+            houses (list[str]): houses of the matrix rows
+
+        Returns:
+            pd.DataFrame: houses x (precision, recall, f1, support)
+    """
+    k = len(houses)
+    correct = np.diag(matrix[:, :k]).astype(float)
+    predicted = matrix[:, :k].sum(axis=0)
+    support = matrix.sum(axis=1)
+
+    precision = correct / np.maximum(predicted, 1)
+    recall = correct / np.maximum(support, 1)
+    f1 = 2 * precision * recall / np.maximum(precision + recall, tiny)
+
+    return pd.DataFrame(
+        {
+            'precision': precision,
+            'recall': recall,
+            'f1': f1,
+            'support': support
+        },
+        index=houses)
+
+
+def print_report(matrix: np.array, houses: list[str], total: int,
+                 unmatched: int, loss: float) -> None:
+    """Print the confusion matrix, house scores and test set score
+
+        Parameters:
+            matrix (np.array): confusion matrix from confusion_matrix
+            houses (list[str]): houses of the matrix rows
+            total (int): number of students in the truth
+            unmatched (int): predictions without truth
+            loss (float): log-loss, None when not computed
+    """
+    k = len(houses)
+    shown = [i for i in range(k + 2) if i < k or matrix[:, i].any()]
+    table = pd.DataFrame(matrix[:, shown],
+                         index=houses,
+                         columns=[(houses + ['Other', 'Missing'])[i]
+                                  for i in shown])
+    table.index.name = 'truth \\ predicted'
+    print(f'Confusion matrix:\n{table}\n')
+
+    scores = house_scores(matrix, houses)
+    print(f'{scores.to_string(float_format="{:.4f}".format)}')
+    print(f'{color_grey}Macro F1: {scores["f1"].mean():.4f}{color_d}')
+
+    missing = matrix[:, k + 1].sum()
+    if missing or unmatched:
+        print(f'{color_r}{missing} students without prediction, '
+              f'{unmatched} predictions without truth{color_d}')
+    if loss is not None:
+        print(f'{color_grey}Log-loss: {loss:.5f}{color_d}')
+    print()
+
+    score = np.trace(matrix[:, :k]) / max(total, 1) * 100
     if score >= 98:
         print(f"{color_g}Your score on test set: {score:.2f}%")
         print(f"Good job! Mc Gonagall congratulates you {color_d}")
     else:
         print(f"{color_r}Your score on test set: {score:.2f}%")
         print(f"Too bad, Mc Gonagall flunked you.{color_d}")
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: evaluation settings
+    """
+    path = f'{os.path.dirname(os.path.realpath(__file__))}/results'
+    parser = argparse.ArgumentParser(
+        description='Evaluate predictions against the truth')
+    parser.add_argument('truth',
+                        nargs='?',
+                        default=f'{path}/dataset_truth.csv',
+                        help='csv file with the true houses')
+    parser.add_argument('predictions',
+                        nargs='?',
+                        default=f'{path}/houses.csv',
+                        help='csv file with the predicted houses')
+    parser.add_argument('-p',
+                        '--probabilities',
+                        help='csv file with the probability of every house, '
+                        'to compute the log-loss')
+    parser.add_argument('-c',
+                        '--chunksize',
+                        type=int,
+                        help='read predictions and probabilities in chunks '
+                        'of this many rows')
+
+    args = parser.parse_args()
+    check_file(args.truth)
+    check_file(args.predictions)
+    if args.probabilities:
+        check_file(args.probabilities)
+
+    return args
+
+
+def main() -> None:
+    """Main function
+    """
+    args = parse_arguments()
+    truth, houses = load_truth(args.truth)
+
+    matrix, unmatched = confusion_matrix(
+        truth, houses, read_chunks(args.predictions, args.chunksize))
+
+    loss = None
+    if args.probabilities:
+        loss = log_loss(truth, houses,
+                        read_chunks(args.probabilities, args.chunksize))
+
+    print_report(matrix, houses, len(truth), unmatched, loss)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        sys.exit('\nExiting...')
+    except Exception as e:
+        sys.exit(f'Error. {e}')
@@ -0,0 +1,209 @@
+"""Logistic Regression - Cross-validation
+
+Runs a stratified k-fold cross-validation of every combination of the
+given hyperparameters in parallel worker processes. The normalized
+dataset is written once to .npy files that every worker memory-maps, so
+tasks only carry fold and setting numbers. The best setting is then
+trained on the whole dataset and saved like logreg_train does.
+"""
+import os
+import sys
+import argparse
+import tempfile
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from logreg_train import (train_model, prediction, save_results, iterations,
+                          learning_rate, tolerance, optimizers, seed, c_pink,
+                          c_green, c_grey, c_end)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dslr_extra.utils import getLRData, check_file
+
+folds = 5
+worker_data = {}
+
+
+def stratified_folds(y: np.array, k: int, rng_seed: int = seed) -> np.array:
+    """Assign every student to one of k folds, spreading the students of
+    every house evenly over the folds
+
+        Parameters:
+            y: np.array - one-hot houses (houses x students)
+            k: int - number of folds
+            rng_seed: int - shuffling seed
+
+        Return:
+            np.array: fold of every student
+    """
+    rng = np.random.default_rng(rng_seed)
+    labels = np.argmax(y, axis=0)
+    fold = np.empty(len(labels), dtype=int)
+
+    for house in range(y.shape[0]):
+        members = rng.permutation(np.flatnonzero(labels == house))
+        fold[members] = np.arange(len(members)) % k
+
+    return fold
+
+
+def init_worker(path: str) -> None:
+    """Memory-map the shared dataset once per worker process
+
+        Parameters:
+            path: str - directory holding x.npy, y.npy and fold.npy
+    """
+    for name in ('x', 'y', 'fold'):
+        worker_data[name] = np.load(f'{path}/{name}.npy', mmap_mode='r')
+
+
+def run_fold(setting: tuple, fold: int, houses: list[str]) -> tuple:
+    """Train on every fold but one and score the held out fold
+
+        Parameters:
+            setting: tuple - iterations, learning rate, tolerance, optimizer
+            fold: int - held out fold
+            houses: list[str] - houses to train the model for
+
+        Return:
+            tuple: train and validation accuracy (argmax over houses)
+    """
+    x, y, split = worker_data['x'], worker_data['y'], worker_data['fold']
+    train, valid = split != fold, split == fold
+
+    w, b, _ = train_model(x[:, train],
+                          y[:, train],
+                          houses,
+                          *setting,
+                          quiet=True)
+
+    scores = []
+    for idx in (train, valid):
+        a = prediction(x[:, idx], w, b)
+        scores.append(
+            np.mean(np.argmax(a, axis=0) == np.argmax(y[:, idx], axis=0)) *
+            100)
+
+    return tuple(scores)
+
+
+def print_report(settings: list[tuple], scores: np.array, best: int) -> None:
+    """Print the mean and standard deviation of the fold accuracies of
+    every setting
+
+        Parameters:
+            settings: list[tuple] - iterations, learning rate, tolerance,
+            optimizer
+            scores: np.array - settings x folds x (train, validation)
+            best: int - position of the best setting
+    """
+    print('Cross-validation accuracies (validation | train):')
+    for i, (iters, rate, tol, optimizer) in enumerate(settings):
+        color = c_green if i == best else c_grey
+        mean, std = scores[i].mean(axis=0), scores[i].std(axis=0)
+        print(f'- {color}{optimizer} | iterations {iters} | rate {rate} '
+              f'| tolerance {tol}: {mean[1]:.3f}% ± {std[1]:.3f} '
+              f'| {mean[0]:.3f}% ± {std[0]:.3f}{c_end}')
+    print()
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: cross-validation settings
+    """
+    parser = argparse.ArgumentParser(
+        description='Cross-validate a grid of training settings and save '
+        'the best model')
+    parser.add_argument('dataset', help='path to the training dataset')
+    parser.add_argument('-i',
+                        '--iterations',
+                        type=int,
+                        nargs='+',
+                        default=[iterations],
+                        help='maximum numbers of iterations')
+    parser.add_argument('-l',
+                        '--learning-rate',
+                        type=float,
+                        nargs='+',
+                        default=[learning_rate],
+                        help='learning rates')
+    parser.add_argument('-t',
+                        '--tolerance',
+                        type=float,
+                        nargs='+',
+                        default=[tolerance],
+                        help='convergence tolerances')
+    parser.add_argument('-o',
+                        '--optimizer',
+                        choices=optimizers,
+                        nargs='+',
+                        default=['gd'],
+                        help='update rules')
+    parser.add_argument('-k',
+                        '--folds',
+                        type=int,
+                        default=folds,
+                        help='number of folds')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=None,
+                        help='number of worker processes (default: cpu count)')
+
+    args = parser.parse_args()
+    check_file(args.dataset)
+    if args.folds < 2:
+        parser.error('at least 2 folds are needed')
+
+    return args
+
+
+def main() -> None:
+    """Main function
+    """
+    args = parse_arguments()
+    houses = ['Ravenclaw', 'Hufflepuff', 'Gryffindor', 'Slytherin']
+    settings = list(
+        product(args.iterations, args.learning_rate, args.tolerance,
+                args.optimizer))
+
+    x, y, stats = getLRData(args.dataset, houses)
+    split = stratified_folds(y, args.folds)
+
+    print(f'{c_pink}========================================')
+    print(f'{len(settings)} settings x {args.folds} folds')
+    print(f'========================================\n{c_end}')
+
+    with tempfile.TemporaryDirectory() as path:
+        for name, values in (('x', x), ('y', y), ('fold', split)):
+            np.save(f'{path}/{name}.npy', values)
+
+        with ProcessPoolExecutor(args.jobs,
+                                 initializer=init_worker,
+                                 initargs=(path, )) as executor:
+            futures = [[
+                executor.submit(run_fold, setting, fold, houses)
+                for fold in range(args.folds)
+            ] for setting in settings]
+            scores = np.array([[future.result() for future in setting]
+                               for setting in futures])
+
+    best = int(np.argmax(scores[:, :, 1].mean(axis=1)))
+    print_report(settings, scores, best)
+
+    print('Training best setting on the whole dataset:')
+    w, b, metrics = train_model(x, y, houses, *settings[best])
+    save_results(w, b, houses, stats, metrics)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        sys.exit('\nExiting...')
+    except Exception as e:
+        sys.exit(f'Error. {e}')
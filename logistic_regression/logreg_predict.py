@@ -1,50 +1,386 @@
 """Logistic Regression - Predict
+
+With --chunksize the dataset is scored in chunks appended to the output
+one at a time, so memory stays flat whatever the number of students.
+With --workers the file is split into line-aligned byte ranges scored by
+separate processes, whose outputs are then concatenated in file order.
 """
 import os
 import sys
+import queue
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
-from logreg_train import prediction
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from dslr_extra.utils import parse_input, normalizeData
+from dslr_extra.utils import (check_file, normalizeData, readCsvChunks,
+                              split_csv)
+from dslr_extra.model import load_model, predict_houses
+from dslr_extra.loader import loadDataset, cacheDir
 
+chunksize = 100000
+worker_model = {}
 
-def main() -> None:
-    """Main function
+
+def prepare_data(data: pd.DataFrame, model: dict) -> np.array:
+    """Select and normalize the model features of data
+
+    Features are normalized with the training set parameters saved in the
+    model, so every row is scored independently of the rest of the batch.
+    Legacy weights.csv models have no parameters and fall back to the
+    batch own min/max.
+
+        Parameters:
+            data (pd.DataFrame): data to score
+            model (dict): model returned by load_model
+
+        Returns:
+            np.array: x (features x students) ready for prediction
+    """
+    if model['features'] is None:
+        X = normalizeData(data.select_dtypes(include=['number']).fillna(0))
+        return X.values.T
+
+    values = data[model['features']].astype(model['w'].dtype).fillna(0)
+    X = normalizeData(values, model['min'], model['max'])
+    return X.values.T
+
+
+class ResultWriter:
+    """Append DataFrames indexed by Index to a csv or parquet file
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the output file
+
+            Parameters:
+                path (str): output file, parquet when it ends with .parquet
+        """
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.started = False
+        self.writer = None
+
+        if self.parquet:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError as e:
+                raise Exception('parquet output needs pyarrow') from e
+            self.pyarrow = pyarrow
+        else:
+            self.file = open(path, 'w', encoding='utf-8', newline='')
+
+    def write(self, frame: pd.DataFrame) -> None:
+        """Append rows to the output
+
+            Parameters:
+                frame (pd.DataFrame): rows to write, indexed by Index
+        """
+        if not self.parquet:
+            frame.to_csv(self.file,
+                         header=not self.started,
+                         index=True,
+                         index_label='Index')
+        else:
+            table = self.pyarrow.Table.from_pandas(frame.rename_axis('Index'))
+            if not self.started:
+                self.writer = self.pyarrow.parquet.ParquetWriter(
+                    self.path, table.schema)
+            self.writer.write_table(table)
+
+        self.started = True
+
+    def close(self) -> None:
+        """Flush and close the output file
+        """
+        if not self.parquet:
+            self.file.close()
+        elif self.writer is not None:
+            self.writer.close()
+
+
+def prefetch(iterable, depth: int = 2):
+    """Iterate over iterable in a reader thread, keeping up to depth items
+    ready so parsing the next chunk overlaps scoring the current one
+
+        Parameters:
+            iterable: items to read ahead
+            depth (int): number of items read ahead
+
+        Yields:
+            items of iterable
+    """
+    items = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def read():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                items.put(item)
+        except Exception as e:
+            items.put(e)
+        items.put(done)
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        while (item := items.get()) is not done:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
+
+
+def model_columns(dataset: str, model: dict) -> list[str] | None:
+    """Return the csv columns scoring needs: the index column and the
+    model features, so the other columns are never parsed
+
+        Parameters:
+            dataset (str): path to the dataset
+            model (dict): model returned by load_model
+
+        Returns:
+            list[str] | None: columns to read, every column for legacy
+            weights.csv models
+    """
+    if model['features'] is None:
+        return None
+
+    index = pd.read_csv(dataset, nrows=0).columns[0]
+    return [index, *model['features']]
+
+
+def score_chunks(chunks, model: dict, output: str,
+                 probabilities: str = None) -> int:
+    """Score every chunk and append the results to the outputs
+
+        Parameters:
+            chunks: iterable of pd.DataFrame indexed by Index
+            model (dict): model returned by load_model
+            output (str): path to the houses output
+            probabilities (str): path to the probabilities output, if any
+
+        Returns:
+            int: number of students scored
+    """
+    writers = [ResultWriter(output)]
+    if probabilities:
+        writers.append(ResultWriter(probabilities))
+
+    count = 0
+    try:
+        for chunk in chunks:
+            labels, proba = predict_houses(prepare_data(chunk, model), model)
+            writers[0].write(
+                pd.DataFrame({'Hogwarts House': labels}, index=chunk.index))
+            if probabilities:
+                writers[1].write(
+                    pd.DataFrame(proba.T,
+                                 index=chunk.index,
+                                 columns=model['houses']))
+            count += len(chunk)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    return count
+
+
+def init_worker(path: str) -> None:
+    """Load the model once per worker process
+
+        Parameters:
+            path (str): path to the model file
     """
-    datasets = parse_input(2, ['dataset.csv', 'weights.csv'])
-    houses = ['Gryffindor', 'Slytherin', 'Ravenclaw', 'Hufflepuff']
+    worker_model['model'] = load_model(path)
 
-    data = pd.read_csv(datasets[0], index_col=0).drop('Hogwarts House', axis=1)
-    weights = pd.read_csv(datasets[1])
 
-    X = normalizeData(data.select_dtypes(include=['number']).fillna(0))
-    x = X.values.T
+def score_shard(dataset: str, shard: tuple[int, int], size: int,
+                read_ahead: bool, outputs: tuple) -> int:
+    """Score one byte range of the dataset in a worker process
+
+        Parameters:
+            dataset (str): path to the dataset
+            shard (tuple[int, int]): byte range from split_csv
+            size (int): number of rows read at once
+            read_ahead (bool): parse chunks in a reader thread
+            outputs (tuple): houses and probabilities (or None) part files
+
+        Returns:
+            int: number of students scored
+    """
+    model = worker_model['model']
+    chunks = readCsvChunks(dataset,
+                           size,
+                           shard,
+                           index_col=0,
+                           usecols=model_columns(dataset, model))
+    if read_ahead:
+        chunks = prefetch(chunks)
+
+    return score_chunks(chunks, model, *outputs)
+
+
+def merge_parts(parts: list[str], output: str) -> None:
+    """Concatenate csv part files into the output, keeping one header
+
+        Parameters:
+            parts (list[str]): part files in file order
+            output (str): csv or .parquet output
+    """
+    if output.endswith('.parquet'):
+        writer = ResultWriter(output)
+        try:
+            for part in parts:
+                if os.path.getsize(part):
+                    for chunk in pd.read_csv(part,
+                                             index_col=0,
+                                             chunksize=chunksize):
+                        writer.write(chunk)
+        finally:
+            writer.close()
+        return
+
+    header = False
+    with open(output, 'wb') as out:
+        for part in parts:
+            with open(part, 'rb') as file:
+                line = file.readline()
+                if not header:
+                    out.write(line)
+                    header = bool(line)
+                shutil.copyfileobj(file, out)
 
-    results = pd.DataFrame(np.zeros((x.shape[1], 0)))
-    results['Hogwarts House'] = 'None'
 
-    for house in houses:
-        w = weights[house][1:].values
-        b = np.array(weights[house][0])
+def score_parallel(args: argparse.Namespace) -> int:
+    """Score the dataset with one process per byte range
 
-        predicts = prediction(x, w, b) > 0.5
-        predicts = pd.DataFrame(predicts, columns=['Hogwarts House'])
-        predicts = predicts['Hogwarts House'].apply(lambda x: house
-                                                    if x else 'None')
+        Parameters:
+            args (argparse.Namespace): prediction settings
+
+        Returns:
+            int: number of students scored
+    """
+    shards = split_csv(args.dataset, args.workers)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = [(f'{tmp}/houses-{i}.csv',
+                    f'{tmp}/probabilities-{i}.csv' if args.probabilities else
+                    None) for i in range(len(shards))]
+
+        with ProcessPoolExecutor(len(shards),
+                                 initializer=init_worker,
+                                 initargs=(args.model, )) as executor:
+            counts = list(
+                executor.map(score_shard, [args.dataset] * len(shards),
+                             shards, [args.chunksize or chunksize] *
+                             len(shards), [args.prefetch] * len(shards),
+                             outputs))
+
+        merge_parts([houses for houses, _ in outputs], args.output)
+        if args.probabilities:
+            merge_parts([proba for _, proba in outputs], args.probabilities)
+
+    return sum(counts)
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: prediction settings
+    """
+    parser = argparse.ArgumentParser(description='Predict Hogwarts houses')
+    parser.add_argument('dataset', help='path to the dataset to score')
+    parser.add_argument('model',
+                        help='path to model.json, model.bin or a legacy '
+                        'weights.csv')
+    parser.add_argument('-o',
+                        '--output',
+                        default=f'{os.path.dirname(os.path.realpath(__file__))}'
+                        '/results/houses.csv',
+                        help='houses output, csv or .parquet (needs pyarrow)')
+    parser.add_argument('-p',
+                        '--probabilities',
+                        help='also save the probability of every house to '
+                        'this csv or .parquet file')
+    parser.add_argument('-c',
+                        '--chunksize',
+                        type=int,
+                        help='score the dataset in chunks of this many rows '
+                        '(bounded memory)')
+    parser.add_argument('--prefetch',
+                        action='store_true',
+                        help='parse the next chunk in a reader thread while '
+                        'scoring the current one')
+    parser.add_argument('-w',
+                        '--workers',
+                        type=int,
+                        default=1,
+                        help='score line-aligned ranges of the file in this '
+                        'many processes (chunked, %d rows by default)' %
+                        chunksize)
+
+    args = parser.parse_args()
+    check_file(args.dataset)
+    check_file(args.model, ('.json', '.bin', '.csv'))
+    if args.prefetch and not (args.chunksize or args.workers > 1):
+        parser.error('--prefetch needs --chunksize or --workers')
+
+    return args
+
+
+def main() -> None:
+    """Main function
+    """
+    args = parse_arguments()
+    model = load_model(args.model)
 
-        results = results.where(results['Hogwarts House'] != 'None',
-                                predicts,
-                                axis=0)
+    if (args.chunksize or args.workers > 1) and model['features'] is None:
+        raise Exception('Chunked scoring needs a model.json with '
+                        'normalization parameters')
 
-    results.to_csv('logistic_regression/results/houses.csv',
-                   index=True,
-                   index_label='Index')
+    if args.workers > 1:
+        count = score_parallel(args)
+    else:
+        columns = model_columns(args.dataset, model)
+        if args.chunksize:
+            chunks = readCsvChunks(args.dataset,
+                                   args.chunksize,
+                                   index_col=0,
+                                   usecols=columns)
+            if args.prefetch:
+                chunks = prefetch(chunks)
+        elif columns is not None and cacheDir() is None:
+            chunks = [
+                pd.read_csv(args.dataset, index_col=0, usecols=columns)
+            ]
+        else:
+            # the cache is column-major, only the model columns are paged in
+            chunks = [
+                loadDataset(args.dataset,
+                            model['w'].dtype).drop('Hogwarts House', axis=1)
+            ]
+        count = score_chunks(chunks, model, args.output, args.probabilities)
 
-    print(
-        'Sorting hat predictions saved to logistic_regression/results/houses.csv'
-    )
+    output = os.path.relpath(args.output)
+    if output.startswith('..'):
+        output = args.output
+    print(f'Sorting hat predictions of {count} students saved to {output}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,266 @@
+"""Logistic Regression - Prediction server
+
+Loads the model once and scores rows sent over HTTP (TCP or Unix socket).
+
+    POST /predict   json row, list of rows, {"rows": [...]} or csv payload
+    GET  /metrics   request count and p50/p99 latency
+    GET  /health    liveness check
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import socketserver
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dslr_extra.files import check_file
+from dslr_extra.model import load_model, predict_houses
+
+latency_window = 10000
+
+
+class Metrics:
+    """Thread safe latency recorder
+    """
+
+    def __init__(self, size: int = latency_window) -> None:
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=size)
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+
+    def record(self, latency: float, rows: int) -> None:
+        """Record a served request
+
+            Parameters:
+                latency (float): request latency in seconds
+                rows (int): number of scored rows
+        """
+        with self.lock:
+            self.latencies.append(latency)
+            self.requests += 1
+            self.rows += rows
+
+    def record_error(self) -> None:
+        """Record a failed request
+        """
+        with self.lock:
+            self.errors += 1
+
+    def summary(self) -> dict:
+        """Return counters and latency percentiles in milliseconds
+
+            Returns:
+                dict: metrics summary
+        """
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            summary = {
+                'requests': self.requests,
+                'rows': self.rows,
+                'errors': self.errors
+            }
+
+        if len(latencies):
+            summary['latency_ms'] = {
+                'p50': float(np.percentile(latencies, 50)),
+                'p99': float(np.percentile(latencies, 99)),
+                'mean': float(latencies.mean()),
+                'window': len(latencies)
+            }
+
+        return summary
+
+
+def rows_to_x(rows: list[dict], model: dict) -> np.array:
+    """Build the normalized feature matrix of json rows without pandas
+
+        Parameters:
+            rows (list[dict]): rows as {feature: value}
+            model (dict): model returned by load_model
+
+        Returns:
+            np.array: x (features x students) ready for prediction
+    """
+    values = np.array(
+        [[row.get(feature) for feature in model['features']] for row in rows],
+        dtype=model['w'].dtype).reshape(len(rows), len(model['features']))
+    values = np.nan_to_num(values, nan=0.0)
+
+    return ((values - model['min']) / (model['max'] - model['min'])).T
+
+
+def parse_payload(body: bytes, content_type: str, model: dict) -> tuple:
+    """Parse a json or csv payload into the feature matrix. pandas is only
+    loaded for csv payloads
+
+        Parameters:
+            body (bytes): request body
+            content_type (str): request content type
+            model (dict): model returned by load_model
+
+        Returns:
+            tuple: x (features x students) and row ids (or None)
+    """
+    if 'csv' in content_type:
+        import pandas as pd
+        from logreg_predict import prepare_data
+
+        data = pd.read_csv(io.BytesIO(body))
+        ids = data['Index'].tolist() if 'Index' in data else None
+        return prepare_data(data, model), ids
+
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload = payload.get('rows', [payload])
+
+    ids = [row.get('Index') for row in payload]
+    return rows_to_x(payload, model), ids if any(
+        i is not None for i in ids) else None
+
+
+def make_handler(model: dict, metrics: Metrics) -> type:
+    """Build the request handler class bound to a loaded model
+
+        Parameters:
+            model (dict): model returned by load_model
+            metrics (Metrics): latency recorder
+
+        Returns:
+            type: BaseHTTPRequestHandler subclass
+    """
+
+    class PredictionHandler(BaseHTTPRequestHandler):
+        """Prediction request handler
+        """
+        protocol_version = 'HTTP/1.1'
+
+        def send_json(self, status: int, content: dict) -> None:
+            """Send a json response
+            """
+            body = json.dumps(content).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            """Serve health and metrics
+            """
+            if self.path == '/health':
+                self.send_json(200, {'status': 'ok'})
+            elif self.path == '/metrics':
+                self.send_json(200, metrics.summary())
+            else:
+                self.send_json(404, {'error': 'Not found'})
+
+        def do_POST(self) -> None:
+            """Score the rows of the payload
+            """
+            if self.path != '/predict':
+                self.send_json(404, {'error': 'Not found'})
+                return
+
+            start = time.perf_counter()
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                x, ids = parse_payload(body,
+                                       self.headers.get('Content-Type', ''),
+                                       model)
+                labels, probabilities = predict_houses(x, model)
+            except Exception as e:
+                metrics.record_error()
+                self.send_json(400, {'error': str(e)})
+                return
+
+            predictions = []
+            for i, label in enumerate(labels):
+                result = {
+                    'house': str(label),
+                    'probabilities': dict(
+                        zip(model['houses'], probabilities[:, i].tolist()))
+                }
+                if ids is not None:
+                    result['Index'] = ids[i]
+                predictions.append(result)
+
+            metrics.record(time.perf_counter() - start, len(labels))
+            self.send_json(200, {'predictions': predictions})
+
+        def log_message(self, format, *args) -> None:
+            """Keep the hot path quiet, metrics are served on /metrics
+            """
+
+    return PredictionHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded HTTP server listening on a Unix socket
+    """
+    daemon_threads = True
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: server settings
+    """
+    parser = argparse.ArgumentParser(description='Serve house predictions')
+    parser.add_argument('model', help='path to model.json or model.bin')
+    parser.add_argument('--host', default='127.0.0.1', help='address to bind')
+    parser.add_argument('--port', type=int, default=8000, help='port to bind')
+    parser.add_argument('--socket', help='listen on this Unix socket instead')
+
+    args = parser.parse_args()
+    check_file(args.model, ('.json', '.bin'))
+
+    return args
+
+
+def main() -> None:
+    """Main function
+    """
+    args = parse_arguments()
+    model = load_model(args.model)
+    if model['features'] is None:
+        raise Exception('Serving needs a model with normalization '
+                        'parameters, convert a model.json rather than a '
+                        'legacy weights.csv')
+    handler = make_handler(model, Metrics())
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, handler)
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), handler)
+        address = f'http://{args.host}:{args.port}'
+
+    print(f'Sorting hat listening on {address}')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+
+    except KeyboardInterrupt:
+        sys.exit('\nExiting...')
+    except Exception as e:
+        sys.exit(f'Error. {e}')
@@ -2,17 +2,35 @@
 """
 import os
 import sys
+import json
+import time
+import shutil
+import argparse
+from contextlib import nullcontext
 
 import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score
-from alive_progress import alive_bar
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from dslr_extra.utils import getLRData, parse_input
+from dslr_extra.utils import (getLRData, getLRStats, getLRChunks,
+                              getLRFeatures, check_file)
+from dslr_extra.model import (prediction, save_model, load_model,
+                              model_digest)
 
 iterations = 10000
 learning_rate = 0.05
+tolerance = 1e-6
+optimizers = ['gd', 'momentum', 'adam', 'newton']
+epochs = 100
+batch_size = 32
+seed = 42
+
+momentum = 0.9
+adam_betas = (0.9, 0.999)
+epsilon = 1e-8
+dtypes = ['float64', 'float32']
+min_score = 10.0
+max_corr = 0.95
 
 c_green = "\033[92m"
 c_pink = "\033[95m"
@@ -21,125 +39,596 @@ c_grey = "\033[90m"
 c_end = "\033[0m"
 
 
-def sigmoid(x: np.array) -> np.array:
-    """Apply the sigmoid function to x
+def calculate_accuracy(x: np.array, y: np.array, w: np.array,
+                       b: np.array) -> list[float]:
+    """Returns the accuracy of every house model in %
 
         Parameters:
-            x: np.array - input values
+            x: np.array - dependent variables
+            y: np.array - independent variables (one row per house)
+            w: np.array - weights (one column per house)
+            b: np.array - bias (one row per house)
 
         Return:
-            np.array: sigmoid(x)
+            list[float]: accuracy of each house model
     """
-    return 1 / (1 + np.exp(-x))
+    a = (prediction(x, w, b) > 0.5).astype(int)
+
+    return (np.mean(y == a, axis=1) * 100).tolist()
 
 
-def prediction(x: np.array, w: np.array, b: np.array) -> np.array:
-    """Returns the prediction for x given w and b
+def calculate_cost(y: np.array, a: np.array) -> np.array:
+    """Returns the log-loss of every house model
 
         Parameters:
-            x: np.array - dependent variables
-            w: np.array - weights
-            b: np.array - bias
+            y: np.array - independent variables (one row per house)
+            a: np.array - predictions (one row per house)
 
         Return:
-            np.array: prediction for x
+            np.array: cost of each house model
     """
-    z = np.dot(w.T, x) + b
-    return sigmoid(z)
+    m = y.shape[1]
+    tiny = np.finfo(a.dtype).tiny
+    return -(1 / m) * np.sum(y * np.log(np.maximum(a, tiny)) +
+                             (1 - y) * np.log(np.maximum(1 - a, tiny)),
+                             axis=1)
 
 
-def calculate_accuracy(x: np.array, y: np.array, w: np.array,
-                       b: np.array) -> float:
-    """Returns the accuracy of the model in %
+def optimizer_step(optimizer: str, state: dict, x: np.array, a: np.array,
+                   dw: np.array, db: np.array,
+                   step: int) -> tuple[np.array, np.array]:
+    """Returns the update to apply to the weights and bias of every house
 
         Parameters:
-            x: np.array - dependent variables
-            y: np.array - independent variables
-            w: np.array - weights
-            b: np.array - bias
+            optimizer: str - gd, momentum, adam or newton
+            state: dict - optimizer state kept between iterations
+            x: np.array - dependent variables (features x students)
+            a: np.array - current predictions (houses x students)
+            dw: np.array - weights gradient (features x houses)
+            db: np.array - bias gradient (houses x 1)
+            step: int - current iteration, starting at 1
 
         Return:
-            float: accuracy of the model
+            tuple[np.array, np.array]: weights and bias updates
     """
-    a = (prediction(x, w, b) > 0.5).astype(int)
+    if optimizer == 'momentum':
+        state['vw'] = momentum * state.get('vw', 0) + dw
+        state['vb'] = momentum * state.get('vb', 0) + db
+        return state['lr'] * state['vw'], state['lr'] * state['vb']
+
+    if optimizer == 'adam':
+        beta1, beta2 = adam_betas
+        updates = []
+        for key, grad in (('w', dw), ('b', db)):
+            state[f'm{key}'] = beta1 * state.get(f'm{key}', 0) + (1 -
+                                                                  beta1) * grad
+            state[f'v{key}'] = beta2 * state.get(f'v{key}', 0) + (
+                1 - beta2) * grad**2
+            m_hat = state[f'm{key}'] / (1 - beta1**step)
+            v_hat = state[f'v{key}'] / (1 - beta2**step)
+            updates.append(state['lr'] * m_hat / (np.sqrt(v_hat) + epsilon))
+        return updates[0], updates[1]
+
+    if optimizer == 'newton':
+        # IRLS: one Hessian per house over the bias-augmented features
+        m = x.shape[1]
+        x_bias = np.vstack((np.ones((1, m), dtype=x.dtype), x))
+        s = a * (1 - a)
+        hessian = np.einsum('im,km,jm->kij', x_bias, s, x_bias) / m
+        hessian += epsilon * np.eye(x_bias.shape[0], dtype=x.dtype)
+        grad = np.hstack((db, dw.T))[..., np.newaxis]
+        delta = np.linalg.solve(hessian, grad)[..., 0]
+        return delta[:, 1:].T, delta[:, :1]
+
+    return state['lr'] * dw, state['lr'] * db
+
+
+def feature_statistics(chunks) -> dict:
+    """Accumulate the sufficient statistics of feature selection over a
+    stream of chunks: row count, house counts and sums, feature sums and
+    the feature cross products
+
+        Parameters:
+            chunks: iterable of (x, y) chunks
+
+        Return:
+            dict: m, house_count, house_sum, sum and cross statistics
+    """
+    stats = {'m': 0, 'house_count': 0, 'house_sum': 0, 'sum': 0, 'cross': 0}
+    for x, y in chunks:
+        stats['m'] += x.shape[1]
+        stats['house_count'] += np.sum(y, axis=1)
+        stats['house_sum'] += np.dot(y, x.T)
+        stats['sum'] += np.sum(x, axis=1)
+        stats['cross'] += np.dot(x, x.T)
 
-    return accuracy_score(y[0], a[0]) * 100
+    return stats
 
 
-def train_model(dataset: str, house: str) -> tuple[np.array, np.array, float]:
-    """Model training function
+def select_features(stats: dict,
+                    min_score: float = min_score,
+                    max_corr: float = max_corr) -> tuple[np.array, np.array]:
+    """Rank features by their one-way ANOVA F score across houses, then
+    keep them greedily from best to worst, skipping any feature scoring
+    below min_score or whose absolute correlation with an already kept
+    feature is above max_corr
 
         Parameters:
-            dataset: str - path to the dataset
-            house: str - house to train the model for
+            stats: dict - statistics from feature_statistics
+            min_score: float - minimum F score of a kept feature
+            max_corr: float - maximum absolute correlation between two
+            kept features
+
+        Return:
+            tuple[np.array, np.array]: kept feature positions (in original
+            order) and the F score of every feature
+    """
+    m = stats['m']
+    k = len(stats['house_count'])
+    count = np.maximum(stats['house_count'], 1)[:, np.newaxis]
+    mean = stats['sum'] / m
+    house_mean = stats['house_sum'] / count
+
+    between = np.sum(count * (house_mean - mean)**2, axis=0) / (k - 1)
+    within = (np.diag(stats['cross']) -
+              np.sum(count * house_mean**2, axis=0)) / (m - k)
+    scores = between / np.maximum(within, epsilon)
+
+    cov = stats['cross'] / m - np.outer(mean, mean)
+    std = np.sqrt(np.maximum(np.diag(cov), epsilon))
+    corr = np.abs(cov / np.outer(std, std))
+
+    kept = []
+    for i in np.argsort(-scores, kind='stable'):
+        if scores[i] < min_score:
+            break
+        if all(corr[i, j] <= max_corr for j in kept):
+            kept.append(i)
+
+    if not kept:
+        raise Exception('No feature passed the selection')
+
+    return np.sort(kept), scores
+
+
+def subset_stats(stats: tuple, kept: np.array) -> tuple:
+    """Restrict features, min and max to the kept features
+
+        Parameters:
+            stats: tuple - features, min and max
+            kept: np.array - positions of the kept features
 
         Return:
-            tuple[np.array, np.array, any]: weights, bias, accuracy
+            tuple: features, min and max of the kept features
     """
-    x, y = getLRData(dataset, house)
+    features, data_min, data_max = stats
+    features = [features[i] for i in kept]
 
+    return features, data_min[features], data_max[features]
+
+
+def print_selection(features: list[str], kept: np.array,
+                    scores: np.array) -> None:
+    """Print the selected and dropped features with their F score
+
+        Parameters:
+            features: list[str] - every candidate feature
+            kept: np.array - positions of the kept features
+            scores: np.array - F score of every feature
+    """
+    print(f'Selected {len(kept)} of {len(features)} features:')
+    for i in np.argsort(-scores, kind='stable'):
+        color = c_green if i in kept else c_grey
+        print(f'- {color}{features[i]}: F = {scores[i]:.1f}{c_end}')
+    print()
+
+
+def progress(total: int, title: str, quiet: bool):
+    """Return the training progress bar, or a context yielding None when
+    quiet so the training loop skips every progress callback
+
+        Parameters:
+            total: int - number of steps
+            title: str - bar title
+            quiet: bool - disable the bar
+
+        Return:
+            context manager yielding the bar or None
+    """
+    if quiet:
+        return nullcontext()
+
+    from alive_progress import alive_bar
+
+    return alive_bar(total,
+                     title=title,
+                     bar='circles',
+                     spinner='dots_waves',
+                     stats_end=False,
+                     title_length=12,
+                     spinner_length=3,
+                     receipt_text=True)
+
+
+def train_model(x: np.array,
+                y: np.array,
+                houses: list[str],
+                max_iterations: int = iterations,
+                rate: float = learning_rate,
+                tol: float = tolerance,
+                optimizer: str = 'gd',
+                cost_every: int = None,
+                quiet: bool = False,
+                init: tuple = None) -> tuple[np.array, np.array, dict]:
+    """One-vs-rest model training function. Every house is trained at the
+    same time, sharing the same matrix products on each iteration. A house
+    stops updating once its gradient norm or its relative cost improvement
+    falls below tol, and training ends when every house has converged.
+    Weights and bias take the dtype of x.
+
+        Parameters:
+            x: np.array - dependent variables (features x students)
+            y: np.array - independent variables (houses x students)
+            houses: list[str] - houses to train the model for
+            max_iterations: int - iterations budget
+            rate: float - learning rate (ignored by newton)
+            tol: float - convergence tolerance
+            optimizer: str - gd, momentum, adam or newton
+            cost_every: int - iterations between cost evaluations, which
+            also check the cost improvement (default: 1% of
+            max_iterations, 0 disables them)
+            quiet: bool - no progress bar
+            init: tuple - weights and bias to start from (warm start),
+            zeros when None
+
+        Return:
+            tuple[np.array, np.array, dict]: weights, bias, per-house
+            metrics (accuracy, cost, iterations, grad_norm) and the history
+            of cost evaluations (iteration, cost, time)
+    """
     m = x.shape[1]
     n = x.shape[0]
-
-    w = np.zeros((n, 1))
-    b = np.zeros((1, 1))
-
-    initial_cost = 0
-    with alive_bar(iterations,
-                   title=f'- {house}',
-                   bar='circles',
-                   spinner='dots_waves',
-                   stats_end=False,
-                   title_length=12,
-                   spinner_length=3,
-                   receipt_text=True) as progress_bar:
-        for i in range(1, iterations + 1):
+    k = len(houses)
+
+    w = np.zeros((n, k), dtype=x.dtype)
+    b = np.zeros((k, 1), dtype=x.dtype)
+    if init is not None:
+        w, b = init[0].astype(x.dtype), init[1].astype(x.dtype)
+
+    state = {'lr': rate}
+    active = np.ones(k, dtype=bool)
+    used_iterations = np.full(k, max_iterations)
+    grad_norm = np.zeros(k)
+    cost = np.full(k, np.inf)
+    if cost_every is None:
+        cost_every = max(1, max_iterations // 100)
+    history = []
+    started = time.perf_counter()
+
+    with progress(max_iterations, '- Houses', quiet) as progress_bar:
+        for i in range(1, max_iterations + 1):
             a = prediction(x, w, b)
 
-            dw = (1 / m) * np.dot(a - y, x.T)
-            db = (1 / m) * np.sum(a - y)
+            dw = (1 / m) * np.dot(x, (a - y).T)
+            db = (1 / m) * np.sum(a - y, axis=1, keepdims=True)
+
+            step_w, step_b = optimizer_step(optimizer, state, x, a, dw, db, i)
+            w = w - step_w * active
+            b = b - step_b * active[:, np.newaxis]
+
+            grad_norm = np.sqrt(np.sum(dw**2, axis=0) + db[:, 0]**2)
+            converged = active & (grad_norm < tol)
+
+            if cost_every and i % cost_every == 0:
+                previous_cost = cost
+                cost = calculate_cost(y, a)
+
+                if np.isnan(cost).any():
+                    raise Exception('Cost function result is NaN.')
+
+                improvement = (previous_cost - cost) / np.maximum(cost, epsilon)
+                converged |= active & (np.abs(improvement) < tol)
+                history.append({
+                    'iteration': i,
+                    'cost': cost.tolist(),
+                    'time': time.perf_counter() - started
+                })
+                if progress_bar:
+                    progress_bar.text(f'| Cost: {np.mean(cost):.5f}')
+
+            used_iterations[converged] = i
+            active &= ~converged
+            if progress_bar:
+                progress_bar()
+
+            if not active.any():
+                break
 
-            w = w - learning_rate * dw.T
-            b = b - learning_rate * db
+    metrics = {
+        'accuracy': calculate_accuracy(x, y, w, b),
+        'cost': calculate_cost(y, prediction(x, w, b)).tolist(),
+        'iterations': used_iterations.tolist(),
+        'grad_norm': grad_norm.tolist(),
+        'history': history
+    }
 
-            if i % (iterations / 100) == 0:
-                cost = -(1 / m) * np.sum(y * np.log(a) +
-                                         (1 - y) * np.log(1 - a))
+    return w, b, metrics
 
-                if i <= (iterations / 100):
-                    initial_cost = cost
 
-                progress_bar.text(
-                    f'| Initial Cost: {initial_cost:.5f}| Cost: {cost:.5f}')
+def evaluate_chunks(chunks, w: np.array, b: np.array) -> dict:
+    """Accumulate accuracy, cost and full gradient norm of every house
+    model over a stream of chunks
 
-                if np.isnan(cost):
+        Parameters:
+            chunks: iterable of (x, y) chunks
+            w: np.array - weights (one column per house)
+            b: np.array - bias (one row per house)
+
+        Return:
+            dict: per-house accuracy, cost and grad_norm
+    """
+    m, correct, cost = 0, 0, 0
+    dw, db = 0, 0
+    for x, y in chunks:
+        a = prediction(x, w, b)
+        m += x.shape[1]
+        correct += np.sum((a > 0.5).astype(int) == y, axis=1)
+        cost += calculate_cost(y, a) * x.shape[1]
+        dw += np.dot(x, (a - y).T)
+        db += np.sum(a - y, axis=1)
+
+    grad_norm = np.sqrt(np.sum((dw / m)**2, axis=0) + (db / m)**2)
+
+    return {
+        'accuracy': (correct / m * 100).tolist(),
+        'cost': (cost / m).tolist(),
+        'grad_norm': grad_norm.tolist()
+    }
+
+
+def train_model_sgd(dataset: str,
+                    houses: list[str],
+                    stats: tuple,
+                    chunksize: int,
+                    max_epochs: int = epochs,
+                    batch: int = batch_size,
+                    rate: float = learning_rate,
+                    tol: float = tolerance,
+                    optimizer: str = 'gd',
+                    cost_every: int = None,
+                    quiet: bool = False,
+                    dtype: np.dtype = np.float64,
+                    init: tuple = None) -> tuple[np.array, np.array, dict]:
+    """Out-of-core one-vs-rest training. The dataset is read in chunks:
+    every epoch streams the chunks normalized with the parameters of a
+    previous getLRStats pass and runs mini-batch updates on shuffled rows,
+    so memory stays bounded by chunksize. The epoch cost is the mean cost
+    of the sampled mini-batches, and a house stops updating once its
+    relative improvement falls below tol.
+
+        Parameters:
+            dataset: str - path to the dataset
+            houses: list[str] - houses to train the model for
+            stats: tuple - features, min and max from getLRStats
+            chunksize: int - number of rows read at once
+            max_epochs: int - epochs budget
+            batch: int - mini-batch size
+            rate: float - learning rate
+            tol: float - convergence tolerance
+            optimizer: str - gd, momentum or adam
+            cost_every: int - mini-batches between cost evaluations
+            (default: every mini-batch, 0 disables them and the cost
+            improvement check)
+            quiet: bool - no progress bar
+            dtype: np.dtype - dtype of the chunks, weights and bias
+            init: tuple - weights and bias to start from (warm start),
+            zeros when None
+
+        Return:
+            tuple[np.array, np.array, dict]: weights, bias, per-house
+            metrics (accuracy, cost, iterations, grad_norm) and the history
+            of epoch costs (iteration, cost, time)
+    """
+    if optimizer == 'newton':
+        raise Exception('newton optimizer is not available for streaming')
+
+    stream = (dataset, houses, *stats, chunksize, dtype)
+
+    n = len(stats[0])
+    k = len(houses)
+
+    w = np.zeros((n, k), dtype=dtype)
+    b = np.zeros((k, 1), dtype=dtype)
+    if init is not None:
+        w, b = init[0].astype(dtype), init[1].astype(dtype)
+
+    rng = np.random.default_rng(seed)
+    state = {'lr': rate}
+    active = np.ones(k, dtype=bool)
+    used_iterations = np.zeros(k, dtype=int)
+    cost = np.full(k, np.inf)
+    if cost_every is None:
+        cost_every = 1
+    step = 0
+    history = []
+    started = time.perf_counter()
+
+    with progress(max_epochs, '- Epochs', quiet) as progress_bar:
+        for _ in range(max_epochs):
+            m, epoch_cost = 0, 0
+            for x, y in getLRChunks(*stream):
+                order = rng.permutation(x.shape[1])
+                for start in range(0, len(order), batch):
+                    idx = order[start:start + batch]
+                    xb, yb = x[:, idx], y[:, idx]
+
+                    a = prediction(xb, w, b)
+                    dw = (1 / len(idx)) * np.dot(xb, (a - yb).T)
+                    db = (1 / len(idx)) * np.sum(a - yb, axis=1, keepdims=True)
+
+                    step += 1
+                    step_w, step_b = optimizer_step(optimizer, state, xb, a,
+                                                    dw, db, step)
+                    w = w - step_w * active
+                    b = b - step_b * active[:, np.newaxis]
+
+                    used_iterations += active
+                    if cost_every and step % cost_every == 0:
+                        m += len(idx)
+                        epoch_cost += calculate_cost(yb, a) * len(idx)
+
+            if m:
+                previous_cost = cost
+                cost = epoch_cost / m
+
+                if np.isnan(cost).any():
                     raise Exception('Cost function result is NaN.')
 
-            progress_bar()
+                improvement = (previous_cost - cost) / np.maximum(
+                    cost, epsilon)
+                active &= ~(np.abs(improvement) < tol)
+                history.append({
+                    'iteration': step,
+                    'cost': cost.tolist(),
+                    'time': time.perf_counter() - started
+                })
+                if progress_bar:
+                    progress_bar.text(f'| Cost: {np.mean(cost):.5f}')
+            if progress_bar:
+                progress_bar()
+
+            if not active.any():
+                break
+
+    metrics = evaluate_chunks(getLRChunks(*stream), w, b)
+    metrics['iterations'] = used_iterations.tolist()
+    metrics['history'] = history
+
+    return w, b, metrics
 
-    accuracy = calculate_accuracy(x, y, w, b)
 
-    return w, b, accuracy
+def parity_check(x: np.array, y: np.array, w: np.array, b: np.array,
+                 x_ref: np.array, w_ref: np.array, b_ref: np.array) -> dict:
+    """Compare a reduced precision model with its float64 reference on
+    the training set
+
+        Parameters:
+            x: np.array - reduced precision features (features x students)
+            y: np.array - independent variables (houses x students)
+            w: np.array - reduced precision weights
+            b: np.array - reduced precision bias
+            x_ref: np.array - float64 features
+            w_ref: np.array - float64 weights
+            b_ref: np.array - float64 bias
+
+        Return:
+            dict: per-house accuracy of both models, % of students given the
+            same house and largest probability difference
+    """
+    a = prediction(x, w, b)
+    a_ref = prediction(x_ref, w_ref, b_ref)
+    same = np.argmax(a, axis=0) == np.argmax(a_ref, axis=0)
+
+    return {
+        'accuracy': calculate_accuracy(x, y, w, b),
+        'reference_accuracy': calculate_accuracy(x_ref, y, w_ref, b_ref),
+        'agreement': float(np.mean(same) * 100),
+        'max_probability_diff': float(np.max(np.abs(a - a_ref)))
+    }
+
+
+def print_parity(houses: list[str], parity: dict) -> None:
+    """Print the result of parity_check
+
+        Parameters:
+            houses: list[str] - list of houses
+            parity: dict - result of parity_check
+    """
+    color = c_green if parity['agreement'] == 100 else c_red
+    print('\nParity with float64:')
+    for i, house in enumerate(houses):
+        print(f'- {house}: {parity["accuracy"][i]}% '
+              f'{c_grey}| float64: {parity["reference_accuracy"][i]}%{c_end}')
+    print(f'- Same house: {color}{parity["agreement"]}%{c_end} '
+          f'{c_grey}| Largest probability difference: '
+          f'{parity["max_probability_diff"]:.2e}{c_end}')
 
 
-def print_header() -> None:
+def print_header(args: argparse.Namespace) -> None:
     """Print initial settings
+
+        Parameters:
+            args: argparse.Namespace - training settings
     """
     print(f'{c_pink}========================================')
-    print(f'Iterations: {iterations} | Learning rate: {learning_rate}')
+    if args.chunksize:
+        print(f'Epochs: {args.epochs} | Batch size: {args.batch_size} '
+              f'| Chunk size: {args.chunksize}')
+        print(f'Learning rate: {args.learning_rate}')
+    else:
+        print(f'Iterations: {args.iterations} '
+              f'| Learning rate: {args.learning_rate}')
+    print(f'Optimizer: {args.optimizer} | Tolerance: {args.tolerance} '
+          f'| Precision: {args.dtype}')
+    if args.warm_start:
+        print(f'Warm start: {args.warm_start}')
+    if args.select:
+        print(f'Feature selection: F >= {args.min_score} '
+              f'| |corr| <= {args.max_corr}')
     print(f'========================================\n{c_end}')
 
 
-def save_results(df: pd.DataFrame, houses: list[str],
-                 accuracies: list[float]) -> None:
-    """Save results to file and print them
+def archive_model(path: str, revision: int) -> str:
+    """Copy a model file into results/models, named after its revision and
+    digest so a copy is never overwritten by a different model
+
+        Parameters:
+            path: str - path to model.json or model.bin
+            revision: int - revision of the model
+
+        Return:
+            str: path to the archived copy
+    """
+    models = f'{os.path.dirname(os.path.realpath(__file__))}/results/models'
+    archive = (f'{models}/model-r{revision}-{model_digest(path)}'
+               f'{os.path.splitext(path)[1]}')
+    os.makedirs(models, exist_ok=True)
+    if not os.path.exists(archive):
+        shutil.copyfile(path, archive)
+
+    return archive
+
+
+def save_results(w: np.array,
+                 b: np.array,
+                 houses: list[str],
+                 stats: tuple,
+                 metrics: dict,
+                 revision: int = 1,
+                 parent: str = None,
+                 columns: list[str] = None,
+                 archive: bool = False) -> None:
+    """Save results to file and print them. weights.csv keeps the legacy
+    layout, one row per dataset feature with zeros for the features the
+    model does not use. model.json also holds the features and
+    normalization parameters, and can be archived in results/models
 
         Parameters:
-            df: pd.DataFrame - dataframe containing the weights
+            w: np.array - weights (features x houses)
+            b: np.array - bias (houses x 1)
             houses: list[str] - list of houses
-            accuracies: list[float] - list of accuracies
+            stats: tuple - features, min and max of the training set
+            metrics: dict - per-house accuracy, cost, iterations and grad_norm
+            revision: int - revision of the model
+            parent: str - digest of the model it was trained from
+            columns: list[str] - features of the weights.csv rows, the
+            model features when None
+            archive: bool - also keep a copy of model.json in results/models
     """
     path = f'{os.path.dirname(os.path.realpath(__file__))}/results'
+    features, data_min, data_max = stats
+    if columns is None:
+        columns = features
 
     if not os.path.exists(path):
         os.mkdir(path)
@@ -147,39 +636,263 @@ def save_results(df: pd.DataFrame, houses: list[str],
     if os.path.exists(f'{path}/weights.csv'):
         os.remove(f'{path}/weights.csv')
 
+    legacy_w = np.zeros((len(columns), len(houses)), dtype=w.dtype)
+    legacy_w[[columns.index(f) for f in features]] = w
+    df = pd.DataFrame(np.vstack((b.T, legacy_w)), columns=houses)
     df.to_csv(f'{path}/weights.csv', mode='a', index=0, header=houses)
+    save_model(f'{path}/model.json', houses, features, w, b, data_min,
+               data_max, revision, parent)
 
     print('\n========================================')
-    print(
-        'Training complete. Results have been saved in logistic_regression/results/weights.csv'
-    )
+    print('Training complete. Results have been saved in '
+          'logistic_regression/results/weights.csv and model.json')
+    if archive:
+        copy = archive_model(f'{path}/model.json', revision)
+        print(f'Model revision {revision} archived in '
+              f'logistic_regression/results/models/{os.path.basename(copy)}')
     print('Accuracies:')
     for i, house in enumerate(houses):
         color = c_red
-        if accuracies[i] > 98.0:
+        if metrics['accuracy'][i] > 98.0:
             color = c_green
 
-        print(f'- {house}: {color}{accuracies[i]}%{c_end}')
+        print(f'- {house}: {color}{metrics["accuracy"][i]}%{c_end} '
+              f'{c_grey}| Cost: {metrics["cost"][i]:.5f} '
+              f'| Iterations: {metrics["iterations"][i]} '
+              f'| Gradient norm: {metrics["grad_norm"][i]:.2e}{c_end}')
     print('========================================')
 
 
+def save_log(path: str, args: argparse.Namespace, houses: list[str],
+             features: list[str], metrics: dict, elapsed: float) -> None:
+    """Write the training settings, final metrics and cost history as json
+
+        Parameters:
+            path: str - path to the log file
+            args: argparse.Namespace - training settings
+            houses: list[str] - list of houses
+            features: list[str] - features the model was trained on
+            metrics: dict - per-house metrics and cost history
+            elapsed: float - training wall time in seconds
+    """
+    settings = {
+        key: value
+        for key, value in vars(args).items() if key not in ('log', 'quiet')
+    }
+    log = {
+        'settings': settings,
+        'houses': houses,
+        'features': list(features),
+        'time': elapsed,
+        **metrics
+    }
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(log, file, indent=2)
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments
+
+        Return:
+            argparse.Namespace: training settings
+    """
+    parser = argparse.ArgumentParser(
+        description='Train a one-vs-rest logistic regression per house')
+    parser.add_argument('dataset', help='path to the training dataset')
+    parser.add_argument('-i',
+                        '--iterations',
+                        type=int,
+                        default=iterations,
+                        help='maximum number of iterations')
+    parser.add_argument('-l',
+                        '--learning-rate',
+                        type=float,
+                        default=learning_rate,
+                        help='learning rate (ignored by newton)')
+    parser.add_argument('-t',
+                        '--tolerance',
+                        type=float,
+                        default=tolerance,
+                        help='stop once gradient norm or relative cost '
+                        'improvement is below this value (0 disables)')
+    parser.add_argument('-o',
+                        '--optimizer',
+                        choices=optimizers,
+                        default='gd',
+                        help='update rule')
+    parser.add_argument('-c',
+                        '--chunksize',
+                        type=int,
+                        help='stream the dataset in chunks of this many rows '
+                        'and train with mini-batches (bounded memory)')
+    parser.add_argument('-e',
+                        '--epochs',
+                        type=int,
+                        default=epochs,
+                        help='maximum number of epochs when streaming')
+    parser.add_argument('-b',
+                        '--batch-size',
+                        type=int,
+                        default=batch_size,
+                        help='mini-batch size when streaming')
+    parser.add_argument('-d',
+                        '--dtype',
+                        choices=dtypes,
+                        default='float64',
+                        help='precision of the data, training and weights')
+    parser.add_argument('--parity',
+                        action='store_true',
+                        help='also train in float64 and compare both models '
+                        'on the training set')
+    parser.add_argument('-w',
+                        '--warm-start',
+                        metavar='MODEL',
+                        help='start from the weights of this model.json (or '
+                        'model.bin) and keep its features and normalization. '
+                        'Both models are archived in results/models')
+    parser.add_argument('-a',
+                        '--archive',
+                        action='store_true',
+                        help='keep a copy of the trained model in '
+                        'results/models')
+    parser.add_argument('-q',
+                        '--quiet',
+                        action='store_true',
+                        help='no settings header nor progress bar')
+    parser.add_argument('--cost-every',
+                        type=int,
+                        help='iterations (mini-batches when streaming) '
+                        'between cost evaluations, which also check the cost '
+                        'improvement (default: 1%% of the iterations, every '
+                        'mini-batch when streaming, 0 disables them)')
+    parser.add_argument('--log',
+                        help='write settings, metrics and the cost history '
+                        'to this json file')
+    parser.add_argument('-s',
+                        '--select',
+                        action='store_true',
+                        help='train on a subset of features selected by '
+                        'ANOVA F score and correlation pruning')
+    parser.add_argument('--min-score',
+                        type=float,
+                        default=min_score,
+                        help='minimum F score of a selected feature')
+    parser.add_argument('--max-corr',
+                        type=float,
+                        default=max_corr,
+                        help='maximum absolute correlation between two '
+                        'selected features')
+
+    args = parser.parse_args()
+    check_file(args.dataset)
+    if args.parity and (args.chunksize or args.dtype == 'float64'):
+        parser.error('--parity needs --dtype float32 without --chunksize')
+    if args.optimizer == 'newton' and args.chunksize:
+        parser.error('newton optimizer is not available with --chunksize')
+    if args.warm_start:
+        check_file(args.warm_start, ('.json', '.bin'))
+        if args.select:
+            parser.error('--select cannot change the features of a warm start')
+
+    return args
+
+
+def load_warm_start(path: str) -> tuple:
+    """Load the model a warm start continues from
+
+        Parameters:
+            path: str - path to model.json or model.bin
+
+        Return:
+            tuple: houses, features with min and max, weights with bias,
+            next revision and digest of the model
+    """
+    model = load_model(path)
+    features = model['features']
+    if features is None:
+        raise Exception('Warm start needs a model with normalization '
+                        'parameters')
+    stats = (features, pd.Series(model['min'], index=features),
+             pd.Series(model['max'], index=features))
+
+    return (model['houses'], stats, (model['w'], model['b']),
+            model['revision'] + 1, model_digest(path))
+
+
 def main() -> None:
     """Main function
     """
-    dataset = parse_input(1, ["dataset.csv"])
+    args = parse_arguments()
     houses = ['Ravenclaw', 'Hufflepuff', 'Gryffindor', 'Slytherin']
-
-    print_header()
-    accuracies = []
-    df = pd.DataFrame()
-    print('Training models:')
-    for house in houses:
-        w, b, accuracy = train_model(dataset, house)
-        w = np.append(b, w)
-        accuracies.append(accuracy)
-        df[house] = w.tolist()
-
-    save_results(df, houses, accuracies)
+    base_stats, init, revision, parent = None, None, 1, None
+    if args.warm_start:
+        houses, base_stats, init, revision, parent = load_warm_start(
+            args.warm_start)
+        archive_model(args.warm_start, revision - 1)
+
+    if not args.quiet:
+        print_header(args)
+
+    if args.chunksize:
+        stats = base_stats or getLRStats(args.dataset, args.chunksize,
+                                         args.dtype)
+        columns = getLRFeatures(
+            args.dataset, args.chunksize) if base_stats else stats[0]
+        if args.select:
+            kept, scores = select_features(
+                feature_statistics(
+                    getLRChunks(args.dataset, houses, *stats, args.chunksize,
+                                args.dtype)), args.min_score,
+                args.max_corr)
+            if not args.quiet:
+                print_selection(stats[0], kept, scores)
+            stats = subset_stats(stats, kept)
+
+        if not args.quiet:
+            print('Training models:')
+        started = time.perf_counter()
+        w, b, metrics = train_model_sgd(args.dataset, houses, stats,
+                                        args.chunksize, args.epochs,
+                                        args.batch_size, args.learning_rate,
+                                        args.tolerance, args.optimizer,
+                                        args.cost_every, args.quiet,
+                                        args.dtype, init)
+    else:
+        x, y, stats = getLRData(args.dataset, houses, args.dtype, base_stats)
+        columns = getLRFeatures(args.dataset) if base_stats else stats[0]
+        if args.select:
+            kept, scores = select_features(feature_statistics([(x, y)]),
+                                           args.min_score, args.max_corr)
+            if not args.quiet:
+                print_selection(stats[0], kept, scores)
+            x, stats = x[kept], subset_stats(stats, kept)
+
+        if not args.quiet:
+            print('Training models:')
+        started = time.perf_counter()
+        w, b, metrics = train_model(x, y, houses, args.iterations,
+                                    args.learning_rate, args.tolerance,
+                                    args.optimizer, args.cost_every,
+                                    args.quiet, init)
+    elapsed = time.perf_counter() - started
+
+    if args.parity:
+        x_ref, y_ref, ref_stats = getLRData(args.dataset, houses,
+                                            stats=base_stats)
+        x_ref = x_ref[[ref_stats[0].index(f) for f in stats[0]]]
+        w_ref, b_ref, _ = train_model(x_ref, y_ref, houses, args.iterations,
+                                      args.learning_rate, args.tolerance,
+                                      args.optimizer, args.cost_every, True,
+                                      init)
+        metrics['parity'] = parity_check(x, y, w, b, x_ref, w_ref, b_ref)
+
+    save_results(w, b, houses, stats, metrics, revision, parent, columns,
+                 args.archive or bool(args.warm_start))
+    if args.parity:
+        print_parity(houses, metrics['parity'])
+    if args.log:
+        save_log(args.log, args, houses, stats[0], metrics, elapsed)
 
 
 if __name__ == '__main__':